@@ -0,0 +1,328 @@
+"""Benchmarks a fixed corpus of OCP/build123d workloads, natively or under Pyodide, to track performance regressions.
+
+Runs like test.py: natively (after `pip install -r requirements-stable.txt`) or inside a `pyodide venv` (where the
+bootstrap installs everything from OCP_WASM_INDEX_URL). The report includes the startup phases (bootstrap, `import OCP`,
+`import build123d` and the first shape) and is saved as pytest-benchmark compatible JSON (also usable with
+`pytest-benchmark compare`). Pass a previous report as --compare to fail on regressions above the thresholds, or a
+native report to a Pyodide run (with --no-fail) to see how much slower WebAssembly is. Use --load to compare a saved
+report instead of running the workloads again.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+PYTEST_BENCHMARK_VERSION = "5.1.0"  # Version of the JSON format written by pytest-benchmark that this mimics
+
+
+# ----- Workloads -----
+# Each workload is a setup function (not timed) that returns the function to time. They only use the public API of
+# build123d (and OCP where it has none), which has been stable since 0.9.
+
+
+def _fillet_box():
+    from build123d import Box, fillet
+
+    def run():
+        box = Box(10, 10, 10)
+        return fillet(box.edges(), radius=1)
+
+    return run
+
+
+def _boolean_cut():
+    from build123d import Box, Cylinder, Pos
+
+    plate = Box(80, 80, 5)
+    holes = [Pos(x, y) * Cylinder(1.5, 10) for x in range(-35, 40, 10) for y in range(-35, 40, 10)]
+
+    def run():
+        return plate - holes
+
+    return run
+
+
+def _boolean_fuse():
+    from build123d import Pos, Sphere
+
+    spheres = [Pos(x * 3, y * 3, 0) * Sphere(2) for x in range(5) for y in range(5)]
+
+    def run():
+        part = spheres[0]
+        for sphere in spheres[1:]:
+            part += sphere
+        return part
+
+    return run
+
+
+def _loft_sweep():
+    from build123d import Circle, Helix, Plane, Rectangle, loft, sweep
+
+    def run():
+        lofted = loft([Plane.XY * Rectangle(10, 10), (Plane.XY.offset(10) * Circle(4)).faces()[0]])
+        path = Helix(pitch=5, height=20, radius=10)
+        swept = sweep((Plane(path @ 0, z_dir=path % 0) * Circle(1)).faces()[0], path=path)
+        return lofted, swept
+
+    return run
+
+
+def _sample_part():
+    """A mildly complex part (booleans and fillets) for the meshing and exchange workloads."""
+    from build123d import Axis, Box, Cylinder, Pos, fillet
+
+    part = Box(40, 30, 10) - [Pos(x, y) * Cylinder(3, 20) for x in (-12, 0, 12) for y in (-7, 7)]
+    return fillet(part.edges().filter_by(Axis.Z), radius=2)
+
+
+def _mesh():
+    from OCP.BRepTools import BRepTools
+    part = _sample_part()
+
+    def run():
+        BRepTools.Clean_s(part.wrapped)  # Mesh from scratch every time
+        return part.tessellate(0.01, 0.1)
+
+    return run
+
+
+def _export_step():
+    from build123d import export_step
+    part = _sample_part()
+    path = os.path.join(tempfile.mkdtemp(), "part.step")
+
+    def run():
+        assert export_step(part, path)
+
+    return run
+
+
+def _import_step():
+    from build123d import export_step, import_step
+    path = os.path.join(tempfile.mkdtemp(), "part.step")
+    assert export_step(_sample_part(), path)
+
+    def run():
+        return import_step(path)
+
+    return run
+
+
+def _export_stl():
+    from build123d import export_stl
+    part = _sample_part()
+    path = os.path.join(tempfile.mkdtemp(), "part.stl")
+
+    def run():
+        assert export_stl(part, path, tolerance=0.01)
+
+    return run
+
+
+WORKLOADS = {  # name -> (group, setup)
+    "fillet_box": ("modeling", _fillet_box),
+    "boolean_cut": ("modeling", _boolean_cut),
+    "boolean_fuse": ("modeling", _boolean_fuse),
+    "loft_sweep": ("modeling", _loft_sweep),
+    "mesh": ("meshing", _mesh),
+    "export_step": ("exchange", _export_step),
+    "import_step": ("exchange", _import_step),
+    "export_stl": ("exchange", _export_stl),
+}
+
+
+# ----- Measurements -----
+
+def _stats(data):
+    """The statistics of pytest-benchmark for a list of timings (seconds)."""
+    data = sorted(data)
+    rounds = len(data)
+    mean = statistics.mean(data)
+    stddev = statistics.stdev(data) if rounds > 1 else 0.0
+    q1, median, q3 = statistics.quantiles(data, n=4, method="inclusive") if rounds > 1 else (data[0],) * 3
+    iqr = q3 - q1
+    ld15iqr = next(value for value in data if value >= q1 - 1.5 * iqr)
+    hd15iqr = next(value for value in reversed(data) if value <= q3 + 1.5 * iqr)
+    iqr_outliers = sum(1 for value in data if value < ld15iqr or value > hd15iqr)
+    stddev_outliers = sum(1 for value in data if abs(value - mean) > stddev)
+    return {"min": data[0], "max": data[-1], "mean": mean, "stddev": stddev, "rounds": rounds, "median": median,
+            "iqr": iqr, "q1": q1, "q3": q3, "iqr_outliers": iqr_outliers, "stddev_outliers": stddev_outliers,
+            "outliers": f"{stddev_outliers};{iqr_outliers}", "ld15iqr": ld15iqr, "hd15iqr": hd15iqr,
+            "ops": 1 / mean if mean > 0 else 0.0, "total": sum(data), "iterations": 1}
+
+
+def _benchmark(name, group, data, options):
+    return {"group": group, "name": name, "fullname": f"benchmark.py::{group}::{name}", "params": None,
+            "param": None, "extra_info": {}, "options": options, "stats": _stats(data)}
+
+
+def measure(fn, min_rounds, max_time, warmup):
+    """Times fn (after warmup calls) at least min_rounds times, and more until max_time seconds are spent."""
+    for _ in range(warmup):
+        fn()
+    data = []
+    deadline = time.perf_counter() + max_time
+    while len(data) < min_rounds or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        fn()
+        data.append(time.perf_counter() - start)
+    return data
+
+
+async def measure_startup():
+    """Times each startup phase once (only meaningful in a fresh process)."""
+    phases = {}
+    start = time.perf_counter()
+    from crossplatformtricks import bootstrap
+    await bootstrap()
+    phases["bootstrap"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    import OCP.BRepPrimAPI  # A module with its dependencies, as the OCP package itself loads nothing
+    phases["import_OCP"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    import build123d
+    phases["import_build123d"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    assert build123d.Box(1, 1, 1).volume > 0
+    phases["first_shape"] = time.perf_counter() - start
+    return phases
+
+
+def machine_info():
+    from importlib import metadata
+    versions = {}
+    for distribution in metadata.distributions():  # Whichever variants of OCP (and lib3mf) are installed
+        name = distribution.metadata["Name"] or ""
+        if name.lower().replace("_", "-").startswith(("cadquery-ocp", "build123d", "lib3mf")):
+            versions[name] = distribution.version
+    return {"node": platform.node(), "processor": platform.processor(), "machine": platform.machine(),
+            "python_compiler": platform.python_compiler(),
+            "python_implementation": platform.python_implementation(),
+            "python_implementation_version": platform.python_version(), "python_version": platform.python_version(),
+            "python_build": list(platform.python_build()), "release": platform.release(), "system": platform.system(),
+            "cpu": {"count": os.cpu_count()}, "sys_platform": sys.platform, "versions": versions}
+
+
+def commit_info():
+    try:
+        import subprocess
+        cwd = os.path.dirname(os.path.abspath(__file__))
+        git = lambda *args: subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True, check=True).stdout
+        return {"id": git("rev-parse", "HEAD").strip(), "dirty": bool(git("status", "--porcelain").strip()),
+                "branch": git("rev-parse", "--abbrev-ref", "HEAD").strip(), "project": "OCP.wasm"}
+    except Exception:  # No git (e.g., under Pyodide)
+        return {}
+
+
+# ----- Comparison -----
+
+def parse_thresholds(values):
+    """Parses `PERCENT` (the default) and `PATTERN=PERCENT` (for `name` or `group::name`) into (default, rules)."""
+    default, rules = 20.0, []
+    for value in values:
+        if "=" in value:
+            pattern, percent = value.rsplit("=", 1)
+            rules.append((pattern, float(percent.rstrip("%"))))
+        else:
+            default = float(value.rstrip("%"))
+    return default, rules
+
+
+def threshold_for(benchmark, default, rules):
+    for pattern, percent in reversed(rules):  # The last matching rule wins
+        qualified_name = f"{benchmark['group']}::{benchmark['name']}"
+        if fnmatch.fnmatch(benchmark["name"], pattern) or fnmatch.fnmatch(qualified_name, pattern):
+            return percent
+    return default
+
+
+def compare(report, baseline, stat, default, rules):
+    """Prints how each benchmark changed since the baseline and returns the names of the regressions."""
+    baseline_benchmarks = {benchmark["fullname"]: benchmark for benchmark in baseline["benchmarks"]}
+    regressions = []
+    print(f"{'Benchmark':<40} {'Baseline':>12} {'Current':>12} {'Ratio':>8}  (by {stat})")
+    for benchmark in report["benchmarks"]:
+        previous = baseline_benchmarks.get(benchmark["fullname"])
+        if previous is None:
+            print(f"{benchmark['fullname']:<40} {'-':>12} {benchmark['stats'][stat]:>12.6f} {'new':>8}")
+            continue
+        ratio = benchmark["stats"][stat] / previous["stats"][stat] if previous["stats"][stat] > 0 else float("inf")
+        threshold = threshold_for(benchmark, default, rules)
+        regressed = ratio > 1 + threshold / 100
+        if regressed:
+            regressions.append(benchmark["fullname"])
+        print(f"{benchmark['fullname']:<40} {previous['stats'][stat]:>12.6f} {benchmark['stats'][stat]:>12.6f} "
+              f"{ratio:>7.2f}x" + (f"  REGRESSION (>{threshold:g}%)" if regressed else ""))
+    return regressions
+
+
+async def run_workloads(args):
+    options = {"min_rounds": args.min_rounds, "max_time": args.max_time, "min_time": 0, "timer": "perf_counter",
+               "disable_gc": False, "warmup": args.warmup > 0}
+    benchmarks = []
+    for name, seconds in (await measure_startup()).items():
+        print(f"{'startup::' + name:<40} {seconds:>12.6f}")
+        benchmarks.append(_benchmark(name, "startup", [seconds], {**options, "min_rounds": 1, "warmup": False}))
+    for name, (group, setup) in WORKLOADS.items():
+        if not fnmatch.fnmatch(name, args.select):
+            continue
+        data = measure(setup(), args.min_rounds, args.max_time, args.warmup)
+        benchmarks.append(_benchmark(name, group, data, options))
+        stats = benchmarks[-1]["stats"]
+        print(f"{group + '::' + name:<40} {stats['median']:>12.6f} (median of {stats['rounds']}, "
+              f"min {stats['min']:.6f}, max {stats['max']:.6f})")
+
+    return {"machine_info": machine_info(), "commit_info": commit_info(), "benchmarks": benchmarks,
+            "datetime": datetime.now(timezone.utc).isoformat(), "version": PYTEST_BENCHMARK_VERSION}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark OCP/build123d workloads (natively or under Pyodide).")
+    parser.add_argument("-k", dest="select", default="*", help="only run the workloads matching this pattern")
+    parser.add_argument("--json", help="save the report (pytest-benchmark format) to this file")
+    parser.add_argument("--load", help="compare this saved report instead of running the workloads")
+    parser.add_argument("--compare", help="a previous report to compare against (the baseline)")
+    parser.add_argument("--compare-stat", default="median", choices=["min", "max", "mean", "median"],
+                        help="the statistic to compare (default: median)")
+    parser.add_argument("--threshold", action="append", default=[],
+                        help="maximum slowdown before failing, as PERCENT (default: 20) or PATTERN=PERCENT for the "
+                             "matching benchmarks (e.g. 'startup::*=50'); can be repeated")
+    parser.add_argument("--no-fail", action="store_true", help="only report regressions (e.g. native vs wasm)")
+    parser.add_argument("--min-rounds", type=int, default=5)
+    parser.add_argument("--max-time", type=float, default=1.0, help="seconds to keep measuring each workload")
+    parser.add_argument("--warmup", type=int, default=1)
+    args = parser.parse_args()
+    default_threshold, threshold_rules = parse_thresholds(args.threshold)  # Fail early on invalid thresholds
+
+    if args.load:
+        with open(args.load) as f:
+            report = json.load(f)
+    else:
+        report = await run_workloads(args)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=4)
+            print(f"Saved the report to {args.json}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.compare_stat, default_threshold, threshold_rules)
+        if regressions and not args.no_fail:
+            print(f"{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    import asyncio
+    asyncio.run(main())
@@ -1,16 +1,102 @@
 import micropip, asyncio, os
 
-async def bootstrap(ocp_index = "https://yeicor.github.io/OCP.wasm"):
+async def bootstrap(ocp_index = "https://yeicor.github.io/OCP.wasm", use_lock = False, simd = False, threads = False):
     # If using the Pyodide JS API, you need to `loadPackage("micropip")` first.
 
-    # Prioritize the OCP.wasm package repository so that wasm-specific packages are preferred.
-    micropip.set_index_urls([ocp_index, "https://pypi.org/simple"])
+    # Opt-in: the SIMD builds of the native packages, if the runtime supports them (simd=None detects it).
+    # XXX: Not the default until they are measured to be faster (see benchmark-simd.json of the CI integration tests).
+    if simd is None: simd = _wasm_simd_supported()
+
+    # Opt-in: the multithreaded OCP build runs OCCT's parallel algorithms (meshing, booleans...) on all cores, but it
+    # requires a Pyodide runtime built with pthreads, which in turn requires a cross-origin isolated page.
+    if threads and not _wasm_threads_supported():
+        print("The multithreaded OCP build requires a pthreads-enabled Pyodide runtime with a shared memory "
+              "(and a cross-origin isolated page), falling back to the single-threaded build...")
+        threads = False
+
+    # Prioritize the OCP.wasm package repository so that wasm-specific packages are preferred. The build variants are
+    # published as separate indexes (<ocp_index>/<variant>) with the same package names, so they satisfy the
+    # requirements of build123d like the baseline builds, and micropip takes each package from the first index with it.
+    variant_indexes = ([f"{ocp_index}/pthreads"] if threads else []) + ([f"{ocp_index}/simd"] if simd else [])
+    micropip.set_index_urls(variant_indexes + [ocp_index, "https://pypi.org/simple"])
+
+    # Optionally, install the pinned dependency closure published by the index (faster, see below).
+    locked = use_lock and await _bootstrap_from_lock(ocp_index, simd, threads)
+
+    if simd and not locked:
+        try:
+            await micropip.install(["cadquery-ocp-novtk", "lib3mf"])
+        except Exception as e:
+            print(f"Could not install the SIMD builds ({e}), falling back to the baseline builds...")
+            variant_indexes.remove(f"{ocp_index}/simd")
+            micropip.set_index_urls(variant_indexes + [ocp_index, "https://pypi.org/simple"])
+    if threads and not locked:
+        await micropip.install("cadquery-ocp-novtk")  # From the pthreads index, no fallback: it was explicitly requested
 
     # ONLY for build123d versions <0.10.0, we need to redirect the import of `py_lib3mf` to our ported `lib3mf` package.
-    await micropip.install("lib3mf")
+    if not locked: await micropip.install("lib3mf")
     micropip.add_mock_package("py-lib3mf", "2.4.1", modules={"py_lib3mf": '''from lib3mf import *'''})
 
     # Install the required packages.
-    await micropip.install(["build123d", "sqlite3"])
+    if not locked: await micropip.install(["build123d", "sqlite3"])
 
     # You can now include your own build123d script, as `import build123d` will work.
+
+
+def _wasm_simd_supported():
+    # Same check as wasm-feature-detect: validate a tiny module using SIMD instructions.
+    from js import WebAssembly
+    from pyodide.ffi import to_js
+    return bool(WebAssembly.validate(to_js(bytes([0, 97, 115, 109, 1, 0, 0, 0, 1, 5, 1, 96, 0, 1, 123, 3, 2, 1, 0,
+                                                  10, 10, 1, 8, 0, 65, 0, 253, 15, 253, 98, 11]))))
+
+
+def _wasm_threads_supported():
+    # Threaded side modules can only be loaded by a pthreads-enabled runtime (as reported by CPython itself), which
+    # needs SharedArrayBuffer: only available in cross-origin isolated pages (Node always has it).
+    import sys, js
+    emscripten_info = getattr(sys, "_emscripten_info", None)
+    if emscripten_info is not None and not emscripten_info.pthreads:
+        return False
+    return hasattr(js, "SharedArrayBuffer") and bool(getattr(js, "crossOriginIsolated", True))
+
+
+async def _bootstrap_from_lock(ocp_index, simd = False, threads = False):
+    # Faster alternative: the index publishes the whole (pinned) dependency closure of build123d, so every wheel
+    # can be downloaded concurrently without any dependency resolution. Returns False to fall back to micropip.
+    from pyodide.http import pyfetch
+    import pyodide_js
+    try:
+        lock = await (await pyfetch(ocp_index + "/micropip-lock.json")).json()
+        if simd:
+            await _use_variants(ocp_index, lock, "simd")
+        if threads:
+            await _use_variants(ocp_index, lock, "pthreads")
+        # Packages from the Pyodide distribution are loaded by name (they are pinned by the running Pyodide version),
+        # the rest directly from their URLs.
+        await pyodide_js.loadPackage([p["file_name"] if "://" in p["file_name"] else p["name"]
+                                      for p in lock["packages"].values()])
+        return True
+    except Exception as e:
+        print(f"Could not bootstrap from the lock file ({e}), falling back to micropip resolution...")
+        return False
+
+
+async def _use_variants(ocp_index, lock, variant):
+    # Replaces the locked wheels that have a variant of the same version (from the PEP 691 JSON pages of the index of
+    # the variant). Only
+    # the packages served by the OCP.wasm index can have variants, and their pages are fetched concurrently.
+    from pyodide.http import pyfetch
+
+    async def use_variant(name, package):
+        response = await pyfetch(f"{ocp_index}/{variant}/{name}/index.json")
+        if not response.ok:
+            return
+        for file in (await response.json())["files"]:
+            if file["filename"].split("-")[1] == package["version"]:
+                package["file_name"] = file["url"]
+                package["sha256"] = file["hashes"]["sha256"]
+                break
+
+    await asyncio.gather(*(use_variant(name, package) for name, package in lock["packages"].items()
+                           if package["file_name"].startswith(ocp_index.rstrip("/") + "/")))
@@ -1,13 +1,25 @@
+import hashlib
+import json
 import os
 import sys
+import tempfile
+import time
 
 if sys.platform == 'emscripten':
     from bootstrap_in_pyodide import bootstrap as _bootstrap
 
-    async def bootstrap():
+    def _bootstrap_kwargs():
         ocp_index = os.environ.get("OCP_WASM_INDEX_URL", "https://yeicor.github.io/OCP.wasm")
-        print(f"Bootstrapping build123d with index {ocp_index}...")
-        await _bootstrap(ocp_index)
+        use_lock = os.environ.get("OCP_WASM_USE_LOCK", "").lower() in {"1", "on", "true", "yes"}
+        simd = os.environ.get("OCP_WASM_SIMD", "").lower() in {"1", "on", "true", "yes"}
+        return {"ocp_index": ocp_index, "use_lock": use_lock, "simd": simd}
+
+    async def bootstrap():
+        kwargs = _bootstrap_kwargs()
+        lock_note = (' (lock file)' if kwargs['use_lock'] else '') + (' (SIMD)' if kwargs['simd'] else '')
+        print(f"Bootstrapping build123d with index {kwargs['ocp_index']}{lock_note}...")
+        await _bootstrap(**kwargs)
+        _install_profiler_from_env()
 
         # Now bootstrap a few optional extra hacks to make all build123d tests pass in pyodide
 
@@ -17,9 +29,7 @@ if sys.platform == 'emscripten':
             if url.startswith("https://") and filename is not None and not reporthook and not data:
                 # print("XXX: Using patched urllib.request.urlretrieve to use pyodide's pyfetch for URL:", url)
                 from pyodide.ffi import run_sync
-                bs = run_sync(common_fetch(url))  # Download the file to cache it
-                with open(filename, "wb") as f:
-                    f.write(bs)
+                run_sync(fetch_to_path(url, filename))
                 return filename, {}  # Return the filename and a dummy response object
             else:
                 return _old_urlretrieve(url, filename, reporthook, data)
@@ -39,30 +49,12 @@ if sys.platform == 'emscripten':
         install_ocp_font_hook()
 
 
-        # XXX: Patch subprocess to use exec with empty globals if we are just running python code... (less isolation, but more compatibility)
+        # XXX: Patch subprocess to run Python code in this interpreter, as Pyodide can't start processes
+        import inprocess_python
+
         def _new_subprocess_run(cmd, *args, **kwargs):
-            if cmd[0] == sys.executable and cmd[1] == '-c':  # If we are running Python code directly (too specific)
-                import io
-                import contextlib
-                import subprocess
-                code = cmd[2]
-                stdout = io.StringIO()
-                stderr = io.StringIO()
-                exit_code = 0
-                oldwd = os.getcwd()
-                with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
-                    try:
-                        os.chdir(kwargs.get('cwd', oldwd))  # Change to the specified working directory if provided
-                        exec(code.replace(').read()', ', "rb").read().decode("utf-8")'), {})
-                    except Exception as e:
-                        # Print exception's stack trace to stderr
-                        import traceback
-                        traceback.print_exc(file=stderr)
-                        stdout.write(str(e) + "\n")
-                        exit_code = 1
-                    finally:
-                        os.chdir(oldwd)
-                return subprocess.CompletedProcess(cmd, exit_code, stdout=stdout.getvalue(), stderr=stderr.getvalue())
+            if inprocess_python.is_python_command(cmd):  # If we are running Python code directly (too specific)
+                return inprocess_python.run(cmd, *args, **kwargs)
             else:
                 return _old_subprocess_run(cmd, *args, **kwargs)
 
@@ -73,39 +65,245 @@ if sys.platform == 'emscripten':
         subprocess.run = _new_subprocess_run
         
 
-    async def common_fetch(url: str) -> bytes:
+    def _supports_conditional_requests() -> bool:
+        # In browsers, the (non-safelisted) conditional headers would require CORS preflights that proxies may reject,
+        # and the browser's own HTTP cache already revalidates responses. Node has no such restrictions.
+        import js
+        return hasattr(js, "process") and js.process.release.name == "node"
+
+
+    async def _stream_url(url: str, headers: dict, file) -> tuple[int, dict]:
         from pyodide.http import pyfetch
-        response = await pyfetch(url)
-        return await response.bytes()
+        if not _supports_conditional_requests():
+            headers = {}
+        response = await pyfetch(url, headers=headers)
+        if response.status == 304:
+            return 304, response.headers
+        if not response.ok:
+            raise OSError(f"Failed to fetch {url}: HTTP {response.status} {response.status_text}")
+        reader = response.js_response.body.getReader()
+        while True:
+            chunk = await reader.read()
+            if chunk.done:
+                break
+            file.write(chunk.value.to_bytes())
+        return response.status, response.headers
+
+
+    def worker_pool_executor(max_workers=None, initializer=None, initargs=()):
+        # Parallel execution: a pool of Pyodide workers, bootstrapped like this interpreter (see pyodide_workers.py)
+        from pyodide_workers import PyodideWorkerPoolExecutor
+        return PyodideWorkerPoolExecutor(max_workers, _bootstrap_kwargs(), initializer, initargs)
 
 
-    async def install_package(package_name: str):
+    async def install_packages(requirements: list[str]):
         import micropip
-        await micropip.install(package_name, reinstall=True)
+        await micropip.install(requirements, reinstall=True)  # Resolved together and downloaded concurrently
 
 
 else:
 
 
     async def bootstrap():
-        pass # Nothing to do for non-pyodide platforms
+        _install_profiler_from_env()  # Nothing else to do for non-pyodide platforms
         
 
-    async def common_fetch(url: str) -> bytes:
+    async def _stream_url(url: str, headers: dict, file) -> tuple[int, dict]:
+        import shutil
+        import urllib.error
         import urllib.request
-        with urllib.request.urlopen(url) as response:
-            return response.read()
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, headers=headers)) as response:
+                shutil.copyfileobj(response, file, _CHUNK_SIZE)
+                return response.status, dict(response.headers)
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return 304, dict(e.headers)
+            raise
+
+
+    def worker_pool_executor(max_workers=None, initializer=None, initargs=()):
+        from concurrent.futures import ProcessPoolExecutor
+        return ProcessPoolExecutor(max_workers, initializer=initializer, initargs=initargs)
 
 
-    async def install_package(package_name: str):
+    async def install_packages(requirements: list[str]):
+        import asyncio
+        import shutil
         import subprocess
-        import sys
-        # Install the package using pip
+        # Resolve and install all the packages at once, with uv if available (concurrent downloads and installs)
+        if shutil.which("uv"):
+            command = ["uv", "pip", "install", "--python", sys.executable, *requirements]
+        else:
+            command = [sys.executable, '-m', 'pip', 'install', *requirements]
         process = await asyncio.create_subprocess_exec(
-            sys.executable, '-m', 'pip', 'install', package_name,
+            *command,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE
         )
         stdout, stderr = await process.communicate()
         if process.returncode != 0:
-            raise Exception(f"Failed to install package {package_name}:\n{stderr.decode()}")
+            raise Exception(f"Failed to install packages {requirements}:\n{stderr.decode()}")
+
+
+async def install_package(package_name: str):
+    await install_packages([package_name])
+
+
+# ----- OCP profiler -----
+
+def _install_profiler_from_env():
+    # XXX: Opt-in call-level profiling of OCP (see ocp_profiler.py), saved as $OCP_WASM_PROFILE.{json,collapsed} at exit
+    # (call ocp_profiler.dump() manually in browsers, where the interpreter never exits)
+    prefix = os.environ.get("OCP_WASM_PROFILE")
+    if prefix:
+        import atexit
+        import ocp_profiler
+        modules = os.environ.get("OCP_WASM_PROFILE_MODULES")  # Comma-separated, e.g. "BRepAlgoAPI,BRepMesh"
+        track_allocations = os.environ.get("OCP_WASM_PROFILE_ALLOCATIONS", "").lower() in {"1", "on", "true", "yes"}
+        ocp_profiler.install(modules.split(",") if modules else None, track_allocations=track_allocations)
+        atexit.register(ocp_profiler.dump, prefix)
+
+
+# ----- Cached downloads -----
+# Downloads are streamed to disk into a content-addressed cache (shared by all URLs with the same contents), revalidated
+# with ETag/Last-Modified on every use and evicted (least recently used first) above OCP_WASM_FETCH_CACHE_MAX_BYTES.
+
+_CHUNK_SIZE = 1 << 20
+FETCH_CACHE_DIR = os.environ.get("OCP_WASM_FETCH_CACHE_DIR",
+                                 os.path.join(os.path.expanduser("~"), ".cache", "ocp-wasm", "fetch"))
+
+
+def _on_persistent_fs(path: str) -> bool:
+    """Whether path is stored outside of the wasm memory (e.g., an IDBFS or NODEFS mount) when running in pyodide."""
+    if sys.platform != 'emscripten':
+        return True
+    try:
+        import pyodide_js
+        path = os.path.abspath(path)
+        while not os.path.exists(path):
+            path = os.path.dirname(path)
+        return pyodide_js.FS.lookupPath(path).node.mount.type != pyodide_js.FS.filesystems.MEMFS
+    except Exception:  # Unknown FS API: assume the worst
+        return False
+
+
+# XXX: The default MEMFS lives in the (limited) wasm memory, so only the latest download is kept there by default
+FETCH_CACHE_MAX_BYTES = int(os.environ.get("OCP_WASM_FETCH_CACHE_MAX_BYTES",
+                                           1 << 30 if _on_persistent_fs(FETCH_CACHE_DIR) else 0))
+
+
+class _HashingWriter:
+    def __init__(self, file):
+        self.file = file
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+
+def _header(headers: dict, name: str):
+    return next((value for key, value in headers.items() if key.lower() == name), None)
+
+
+async def fetch_to_file(url: str) -> str:
+    """Downloads url into the cache (or revalidates the cached copy) and returns the path of the cached file, which
+    must not be modified."""
+    objects_dir = os.path.join(FETCH_CACHE_DIR, "objects")
+    urls_dir = os.path.join(FETCH_CACHE_DIR, "urls")
+    os.makedirs(objects_dir, exist_ok=True)
+    os.makedirs(urls_dir, exist_ok=True)
+    meta_path = os.path.join(urls_dir, hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+    meta = None
+    if os.path.isfile(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if not os.path.isfile(os.path.join(objects_dir, meta["object"])):
+            meta = None
+    headers = {}
+    if meta is not None and meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta is not None and meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    fd, tmp_path = tempfile.mkstemp(dir=objects_dir, prefix=".tmp-")
+    try:
+        with open(fd, "wb") as f:
+            writer = _HashingWriter(f)
+            status, response_headers = await _stream_url(url, headers, writer)
+        if status == 304:
+            os.utime(meta_path)  # Recently used
+            return os.path.join(objects_dir, meta["object"])
+        meta = {"url": url, "object": writer.sha256.hexdigest(), "size": writer.size,
+                "etag": _header(response_headers, "etag"),
+                "last_modified": _header(response_headers, "last-modified")}
+        os.replace(tmp_path, os.path.join(objects_dir, meta["object"]))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(meta_path + ".tmp", meta_path)
+    _evict_fetch_cache(keep=meta_path)
+    return os.path.join(objects_dir, meta["object"])
+
+
+def _evict_fetch_cache(keep: str):
+    """Removes the least recently used URLs (and their contents, if unused by others) until the cache fits its cap."""
+    urls_dir = os.path.join(FETCH_CACHE_DIR, "urls")
+    entries = []
+    for name in os.listdir(urls_dir):
+        if name.endswith(".json"):
+            path = os.path.join(urls_dir, name)
+            with open(path) as f:
+                entries.append((os.stat(path).st_mtime, path, json.load(f)))
+    entries.sort(key=lambda entry: entry[0])
+    object_sizes = {meta["object"]: meta["size"] for _, _, meta in entries}
+    object_users = {}
+    for _, _, meta in entries:
+        object_users[meta["object"]] = object_users.get(meta["object"], 0) + 1
+    for name in os.listdir(os.path.join(FETCH_CACHE_DIR, "objects")):  # Previous contents of updated URLs
+        object_path = os.path.join(FETCH_CACHE_DIR, "objects", name)
+        # (Not just written by a concurrent download that did not write its URL metadata yet)
+        if name not in object_sizes and not name.startswith(".tmp-") and os.stat(object_path).st_mtime < time.time() - 60:
+            os.remove(object_path)
+    total = sum(object_sizes.values())
+    for _, path, meta in entries:
+        if total <= FETCH_CACHE_MAX_BYTES:
+            break
+        if path == keep:
+            continue
+        os.remove(path)
+        object_users[meta["object"]] -= 1
+        object_path = os.path.join(FETCH_CACHE_DIR, "objects", meta["object"])
+        if object_users[meta["object"]] == 0 and os.path.exists(object_path):
+            os.remove(object_path)
+            total -= meta["size"]
+
+
+async def fetch_to_path(url: str, path: str) -> str:
+    """Downloads url into path (which may then be modified) and returns it. The download is cached if the cache is on a
+    persistent filesystem, and streamed straight into path otherwise (so that the wasm memory never holds two copies)."""
+    if FETCH_CACHE_MAX_BYTES > 0 and _on_persistent_fs(FETCH_CACHE_DIR):
+        import shutil
+        shutil.copyfile(await fetch_to_file(url), path)
+        return path
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".tmp-")
+    try:
+        with open(fd, "wb") as f:
+            await _stream_url(url, {}, f)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+async def common_fetch(url: str) -> bytes:
+    """The whole contents of url (through the cache). Prefer fetch_to_file or fetch_to_path for big files."""
+    with open(await fetch_to_file(url), "rb") as f:
+        return f.read()
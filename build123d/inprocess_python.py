@@ -0,0 +1,258 @@
+"""Runs `python -c` subprocesses inside the current interpreter, for platforms that can't start processes (Pyodide).
+
+Each invocation behaves like a separate process as far as possible:
+- Its own stdin, stdout and stderr (per thread, so concurrent invocations never mix their output) and `__main__`
+  globals, with `input`, `capture_output`/PIPE/STDOUT/DEVNULL, `timeout` and `check` supported. Streams that are not
+  redirected are the caller's. Captured output is always str (as returned by the original subprocess patch).
+- A sys.modules overlay: modules imported by it (e.g. mocks it registers) are forgotten when it ends, so they do not
+  leak into the next invocation. Modules imported before are shared, as they would be too slow to import again, and so
+  are the submodules it imports from them (the shared packages keep referring to them).
+- Its working directory and sys.argv, which are only set while it runs and restored afterwards. OCCT resolves relative
+  paths with the process-wide working directory, so concurrent invocations share both: those asking for another
+  directory or other arguments wait.
+- Compiled code is cached by the hash of its source (also for the `exec` calls of the code itself), as the same
+  scripts are usually run many times.
+Independent invocations from several threads run concurrently where threads are available (natively or with a
+pthreads-enabled Pyodide), and one after another otherwise. A timeout can only interrupt Python code, not a long OCCT
+call.
+"""
+import builtins
+import collections
+import hashlib
+import io
+import os
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+CODE_CACHE_SIZE = 256
+
+_code_cache = collections.OrderedDict()  # (source hash, filename) -> code object, least recently used first
+_code_cache_lock = threading.Lock()
+
+_local = threading.local()  # Streams and nesting depth of the invocation running in each thread
+_state = threading.Condition()  # Guards the state shared by all active invocations below
+_active = 0
+_active_key = None  # (cwd, argv) of the active invocations
+_saved = None  # What the first active invocation replaced: (cwd, sys.modules, sys.argv, stdin, stdout, stderr)
+
+_STREAMS = ("stdin", "stdout", "stderr")
+
+
+class _Timeout(BaseException):  # Not an Exception, so that the code can't catch it by accident
+    pass
+
+
+def is_python_command(cmd):
+    return isinstance(cmd, (list, tuple)) and len(cmd) >= 3 and cmd[0] == sys.executable and cmd[1] == "-c"
+
+
+def compile_cached(source, filename="<string>"):
+    """Compiles source (str or bytes) for exec, reusing the code of previous compilations of the same source."""
+    key = (hashlib.sha256(source.encode() if isinstance(source, str) else source).hexdigest(), filename)
+    with _code_cache_lock:
+        code = _code_cache.get(key)
+        if code is not None:
+            _code_cache.move_to_end(key)
+            return code
+    code = compile(source, filename, "exec")
+    with _code_cache_lock:
+        _code_cache[key] = code
+        while len(_code_cache) > CODE_CACHE_SIZE:
+            _code_cache.popitem(last=False)
+    return code
+
+
+class _ThreadLocalStream:
+    """Forwards to the stream of the invocation running in the current thread, or to the original stream."""
+
+    def __init__(self, name, original):
+        self._name = name
+        self._original = original
+
+    def _target(self):
+        return getattr(_local, self._name, None) or self._original
+
+    def __getattr__(self, attr):
+        return getattr(self._target(), attr)
+
+    def __iter__(self):
+        return iter(self._target())
+
+
+def _builtins():
+    """The builtins of the invoked code: `open` defaults to UTF-8 text, like `python -X utf8`, and `exec` of a string
+    uses the code cache."""
+    def _open(file, mode="r", buffering=-1, encoding=None, *args, **kwargs):
+        if "b" not in mode and encoding is None:
+            encoding = "utf-8"
+        return builtins.open(file, mode, buffering, encoding, *args, **kwargs)
+
+    def _exec(source, globals=None, locals=None, *args, **kwargs):
+        if isinstance(source, (str, bytes)):
+            source = compile_cached(source)
+        if globals is None:  # The caller's globals, as exec would use (not the ones of this wrapper)
+            frame = sys._getframe(1)
+            globals, locals = frame.f_globals, frame.f_locals if locals is None else locals
+        return builtins.exec(source, globals, locals, *args, **kwargs)
+
+    custom = dict(vars(builtins))
+    custom["open"] = _open
+    custom["exec"] = _exec
+    return custom
+
+
+def _enter(cwd, argv):
+    """Waits until the invocation can run in cwd with argv and sets up the shared state, returning what to restore at
+    exit."""
+    global _active, _active_key, _saved
+    nested = getattr(_local, "depth", 0) > 0  # Invoked by another invocation of this thread: it must not wait
+    with _state:
+        if cwd is None:  # The working directory of the caller (not the one entered by other active invocations)
+            cwd = _saved[0] if _active and not nested else os.getcwd()
+        while _active and _active_key != (cwd, argv) and not nested:
+            _state.wait()
+        if _active == 0:
+            _saved = (os.getcwd(), dict(sys.modules), sys.argv, *(getattr(sys, name) for name in _STREAMS))
+            for name in _STREAMS:
+                setattr(sys, name, _ThreadLocalStream(name, getattr(sys, name)))
+            _active_key = (cwd, argv)
+        _active += 1
+        # The first invocation restores the original ones at the end
+        previous = (os.getcwd(), sys.argv) if nested else None
+        if cwd != os.getcwd():
+            os.chdir(cwd)
+        if _active == 1 or nested:
+            sys.argv = list(argv)
+    _local.depth = getattr(_local, "depth", 0) + 1
+    return previous, tuple(getattr(_local, name, None) for name in _STREAMS)
+
+
+def _exit(previous, previous_streams):
+    global _active, _active_key, _saved
+    _local.depth -= 1
+    for name, stream in zip(_STREAMS, previous_streams):
+        setattr(_local, name, stream)
+    with _state:
+        _active -= 1
+        if previous is not None:
+            previous_cwd, sys.argv = previous
+            if os.getcwd() != previous_cwd:
+                os.chdir(previous_cwd)
+        if _active == 0:
+            cwd, modules, argv, *streams = _saved
+            kept = set(modules)
+            for name in sorted(name for name in sys.modules if name not in modules):  # Packages before submodules
+                parent, _, child = name.rpartition(".")
+                if parent in kept and getattr(sys.modules.get(parent), child, None) is sys.modules[name]:
+                    kept.add(name)  # Forgetting it would import a second copy next to the one its package refers to
+                else:
+                    del sys.modules[name]
+            for name, module in modules.items():
+                if sys.modules.get(name) is not module:
+                    sys.modules[name] = module
+            for name, stream in zip(_STREAMS, streams):
+                setattr(sys, name, stream)
+            sys.argv = argv
+            if os.getcwd() != cwd:
+                os.chdir(cwd)
+            _active_key = _saved = None
+            _state.notify_all()
+
+
+def _execute(code, deadline):
+    """Runs the code as __main__ and returns its exit code (raising _Timeout if the deadline is reached)."""
+    previous_trace = sys.gettrace()
+    if deadline is not None:
+        def trace(frame, event, arg):
+            if event == "call":  # Also check within lines, as loops on a single line (while True: pass) never leave it
+                frame.f_trace_opcodes = True
+            if time.monotonic() > deadline:
+                raise _Timeout()
+            return trace
+
+        sys.settrace(trace)
+    try:
+        exec(code, {"__name__": "__main__", "__builtins__": _builtins()})
+        return 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    except _Timeout:
+        raise
+    except Exception:
+        traceback.print_exc(file=sys.stderr)
+        return 1
+    finally:
+        sys.settrace(previous_trace)
+
+
+def run(cmd, *_args, stdin=None, input=None, stdout=None, stderr=None, capture_output=False, timeout=None,
+        check=False, cwd=None, text=None, encoding=None, errors=None, universal_newlines=None, **_kwargs):
+    """Like subprocess.run for `[sys.executable, "-c", code, *args]` commands (other arguments are ignored)."""
+    if capture_output:
+        if stdout is not None or stderr is not None:
+            raise ValueError("stdout and stderr arguments may not be used with capture_output.")
+        stdout = stderr = subprocess.PIPE
+    if input is not None:
+        if stdin is not None:
+            raise ValueError("stdin and input arguments may not both be used.")
+        stdin = subprocess.PIPE
+    encoding, errors = encoding or "utf-8", errors or "strict"
+
+    def caller_stream(name):  # What the code would inherit (the caller may be another invocation of this thread)
+        stream = getattr(sys, name)
+        return stream._target() if isinstance(stream, _ThreadLocalStream) else stream
+
+    stdin_stream = caller_stream("stdin")
+    if stdin == subprocess.DEVNULL:
+        stdin_stream = io.StringIO()
+    elif stdin == subprocess.PIPE:
+        stdin_stream = io.StringIO(input.decode(encoding, errors) if isinstance(input, bytes) else input or "")
+    if stdout in (subprocess.PIPE, subprocess.DEVNULL):
+        stdout_stream = io.StringIO()
+    else:
+        stdout_stream = caller_stream("stdout")
+    if stderr == subprocess.STDOUT:
+        stderr_stream = stdout_stream
+    elif stderr in (subprocess.PIPE, subprocess.DEVNULL):
+        stderr_stream = io.StringIO()
+    else:
+        stderr_stream = caller_stream("stderr")
+
+    def output(stream, kind):
+        return stream.getvalue() if kind == subprocess.PIPE else None
+
+    code = compile_cached(cmd[2], "<string>")
+    deadline = None if timeout is None else time.monotonic() + timeout
+    previous = _enter(os.path.abspath(os.fspath(cwd)) if cwd is not None else None, ("-c", *cmd[3:]))
+    try:
+        _local.stdin, _local.stdout, _local.stderr = stdin_stream, stdout_stream, stderr_stream
+        try:
+            returncode = _execute(code, deadline)
+        except _Timeout:
+            raise subprocess.TimeoutExpired(cmd, timeout, output(stdout_stream, stdout), output(stderr_stream, stderr))
+    finally:
+        _exit(*previous)
+
+    completed = subprocess.CompletedProcess(cmd, returncode, output(stdout_stream, stdout),
+                                            output(stderr_stream, stderr))
+    if check:
+        completed.check_returncode()
+    return completed
+
+
+if __name__ == "__main__":  # Self-test: python inprocess_python.py
+    for source in ("while True: pass", "def spin():\n    while True: pass\nspin()"):
+        try:
+            run([sys.executable, "-c", source], timeout=0.5)
+        except subprocess.TimeoutExpired:
+            pass
+        else:
+            raise AssertionError(f"{source!r} did not time out")
+    assert run([sys.executable, "-c", "print('ok')"], capture_output=True, timeout=5).stdout == "ok\n"
+    print("All self-tests passed")
@@ -0,0 +1,239 @@
+"""Call-level profiler of OCP (the OCCT bindings), to find which OCCT operations make a script slow.
+
+Profilers of Python code only see opaque calls into the OCP extension, so this wraps the methods and functions of the
+pybind11 classes of each OCP submodule (also the ones loaded later) to record their call counts, cumulative and self
+times and, optionally (install(track_allocations=True)), the bytes each call left allocated (malloc's bytes in use
+after the call minus before, so negative if it freed more than it allocated). Nothing is wrapped until install() is
+called, and uninstall() restores the original bindings, so there is no overhead when disabled.
+
+    import ocp_profiler
+    ocp_profiler.install()  # Or set OCP_WASM_PROFILE=<prefix> before crossplatformtricks.bootstrap()
+    ...  # Run the slow script
+    ocp_profiler.dump("profile")  # Writes profile.json (summary) and profile.collapsed (for flame graphs)
+
+The collapsed stacks (self microseconds per stack of OCP calls) can be opened with speedscope or flamegraph.pl.
+"""
+import ctypes
+import json
+import sys
+import threading
+import time
+
+_installed = False
+_only_modules = None  # Names of the submodules to instrument (None: all)
+_originals = []  # (owner, attribute name, original value) of every wrapped binding, to restore them
+_instrumented_modules = set()
+_function_wrappers = {}  # id of the original function -> wrapper
+_original_load_module = None
+_heap_statistics = None  # Unwrapped OCP.Standard.Standard_HeapStatistics, if available
+_track_allocations = False
+
+_stats = {}  # label -> [module, calls, cumulative seconds, self seconds, allocated bytes]
+_stacks = {}  # tuple of labels -> self seconds
+_local = threading.local()
+_started = None
+
+
+def _libc_mallinfo2():
+    class Mallinfo2(ctypes.Structure):
+        _fields_ = [(name, ctypes.c_size_t) for name in
+                    ("arena", "ordblks", "smblks", "hblks", "hblkhd", "usmblks", "fsmblks", "uordblks", "fordblks",
+                     "keepcost")]
+
+    try:
+        mallinfo2 = ctypes.CDLL(None).mallinfo2  # glibc >= 2.33
+    except (AttributeError, OSError):
+        return None
+    mallinfo2.restype = Mallinfo2
+
+    def in_use():
+        info = mallinfo2()
+        return info.uordblks + info.hblkhd  # Small and big (mmapped) chunks
+
+    return in_use
+
+
+_libc_in_use = _libc_mallinfo2() if sys.platform.startswith("linux") else None
+
+
+def heap_in_use():
+    """The bytes allocated with malloc (by OCCT and everything else) and not freed yet, or None if unknown.
+
+    Uses Standard_HeapStatistics() of the patched OCP builds (see patch_OCP.cmake) and glibc's mallinfo2() with the
+    upstream native wheels. Both are computed from the allocator's bookkeeping (not the heap size or peak RSS, which
+    never shrink), which can be slow: Emscripten's dlmalloc walks the whole heap."""
+    if _heap_statistics is not None:
+        return _heap_statistics()["in_use"]
+    if _libc_in_use is not None:
+        return _libc_in_use()
+    return None
+
+
+def _record(label, module, original, args, kwargs):
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    frame = [label, 0.0]  # Label and time spent in nested OCP calls (including their profiling overhead)
+    stack.append(frame)
+    outer_start = time.perf_counter() if _track_allocations else None
+    heap_before = heap_in_use() if _track_allocations else None
+    start = time.perf_counter()
+    try:
+        return original(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        allocated = heap_in_use() - heap_before if heap_before is not None else 0
+        stack.pop()
+        if outer_start is not None:  # The measurement of allocations must not count as self time of the caller
+            elapsed_with_overhead = time.perf_counter() - outer_start
+        else:
+            elapsed_with_overhead = elapsed
+        stats = _stats.get(label)
+        if stats is None:
+            stats = _stats[label] = [module, 0, 0.0, 0.0, 0]
+        stats[1] += 1
+        if all(other[0] != label for other in stack):  # Recursive calls are already included in the outermost one
+            stats[2] += elapsed
+        stats[3] += elapsed - frame[1]
+        stats[4] += allocated
+        key = tuple(other[0] for other in stack) + (label,)
+        _stacks[key] = _stacks.get(key, 0.0) + elapsed - frame[1]
+        if stack:
+            stack[-1][1] += elapsed_with_overhead
+
+
+def _wrap_function(label, module, original):
+    def wrapper(*args, **kwargs):
+        return _record(label, module, original, args, kwargs)
+
+    wrapper.__name__ = getattr(original, "__name__", label)
+    wrapper.__doc__ = getattr(original, "__doc__", None)
+    wrapper.__wrapped__ = original
+    return wrapper
+
+
+def _wrappable_members(cls):
+    for name, value in list(vars(cls).items()):
+        if name.startswith("__") and name != "__init__":
+            continue
+        if type(value).__name__ == "instancemethod":  # pybind11 methods (bound to the instance like functions)
+            yield name, value, False
+        elif isinstance(value, staticmethod) and type(value.__func__).__name__ == "builtin_function_or_method":
+            yield name, value, True
+
+
+def _instrument_module(module_name, module):
+    """Wraps the bindings defined by a submodule (e.g. OCP.gp, or OCP.OCP.gp in the native wheels)."""
+    short_name = module_name.rsplit(".", 1)[-1]
+    if module_name in _instrumented_modules or (_only_modules is not None and short_name not in _only_modules):
+        return
+    _instrumented_modules.add(module_name)
+    for name, value in list(vars(module).items()):
+        if isinstance(value, type) and getattr(value, "__module__", None) == module_name:
+            if hasattr(value, "__members__"):  # Enums
+                continue
+            for member_name, member, static in _wrappable_members(value):
+                label = f"{value.__name__}.{member_name}"
+                wrapper = _wrap_function(label, short_name, member.__func__ if static else member)
+                setattr(value, member_name, staticmethod(wrapper) if static else wrapper)
+                _originals.append((value, member_name, member))
+        elif type(value).__name__ == "builtin_function_or_method" and value.__module__ == module_name:
+            _function_wrappers[id(value)] = _wrap_function(f"{short_name}.{name}", short_name, value)
+
+
+def _instrument_loaded_modules():
+    modules = [(module_name, module) for module_name, module in list(sys.modules.items())
+               if module_name.startswith("OCP.") and module is not None]
+    for module_name, module in modules:
+        _instrument_module(module_name, module)
+    # Functions are replaced in every module that has them (they may be re-exported, like classes, which are patched)
+    for module_name, module in modules:
+        for name, value in list(vars(module).items()):
+            wrapper = _function_wrappers.get(id(value))
+            if wrapper is not None and wrapper.__wrapped__ is value:
+                setattr(module, name, wrapper)
+                _originals.append((module, name, value))
+
+
+def _load_module(name):
+    module = _original_load_module(name)
+    _instrument_loaded_modules()  # The requested module and any dependencies registered with it
+    return module
+
+
+def install(modules=None, track_allocations=False):
+    """Instruments all OCP submodules (or only the given names, like "BRepAlgoAPI"), including those loaded later.
+
+    Only calls through the bindings are recorded, so install it before importing names from OCP (e.g. with
+    `from OCP.gp import gp_Pnt`), as module-level functions imported before are not wrapped. Tracking allocations reads
+    heap_in_use() around every call, which slows down scripts with many small calls (in the browser especially)."""
+    global _installed, _only_modules, _original_load_module, _started, _heap_statistics, _track_allocations
+    if _installed:
+        return
+    import OCP
+    _heap_statistics = None
+    if track_allocations:
+        try:  # Before wrapping it (it would record itself)
+            from OCP.Standard import Standard_HeapStatistics as _heap_statistics
+            _heap_statistics()
+        except (ImportError, RuntimeError):  # Upstream wheels or an unsupported platform
+            _heap_statistics = None
+    _track_allocations = track_allocations
+    _installed = True
+    _only_modules = None if modules is None else frozenset(modules)
+    _started = time.perf_counter()
+    _instrument_loaded_modules()
+    if hasattr(OCP, "_load_module"):  # Lazily registered submodules (see patch_OCP.cmake)
+        _original_load_module = OCP._load_module
+        OCP._load_module = _load_module
+
+
+def uninstall():
+    """Restores all the original bindings (the recorded data is kept)."""
+    global _installed, _original_load_module
+    if not _installed:
+        return
+    import OCP
+    if _original_load_module is not None:
+        OCP._load_module = _original_load_module
+        _original_load_module = None
+    for owner, name, original in reversed(_originals):
+        setattr(owner, name, original)
+    _originals.clear()
+    _instrumented_modules.clear()
+    _function_wrappers.clear()
+    _installed = False
+
+
+def reset():
+    """Discards the recorded data."""
+    global _started
+    _stats.clear()
+    _stacks.clear()
+    _started = time.perf_counter()
+
+
+def summary():
+    """The recorded data of each OCP function (slowest self time first)."""
+    functions = [{"name": label, "module": module, "calls": calls, "cumulative_seconds": cumulative,
+                  "self_seconds": self_time, "allocated_bytes": allocated}
+                 for label, (module, calls, cumulative, self_time, allocated) in _stats.items()]
+    functions.sort(key=lambda function: function["self_seconds"], reverse=True)
+    return {"platform": sys.platform, "heap_in_use_bytes": heap_in_use(),
+            "wall_seconds": time.perf_counter() - _started if _started is not None else 0.0,
+            "ocp_seconds": sum(function["self_seconds"] for function in functions), "functions": functions}
+
+
+def collapsed_stacks():
+    """The self time (in microseconds) of each stack of OCP calls, in the collapsed format of flamegraph.pl."""
+    return "".join(f"{';'.join(stack)} {round(seconds * 1e6)}\n" for stack, seconds in sorted(_stacks.items())
+                   if round(seconds * 1e6) > 0)
+
+
+def dump(prefix="ocp-profile"):
+    """Writes <prefix>.json (see summary) and <prefix>.collapsed (see collapsed_stacks)."""
+    with open(prefix + ".json", "w") as f:
+        json.dump(summary(), f, indent=1)
+    with open(prefix + ".collapsed", "w") as f:
+        f.write(collapsed_stacks())
+    print(f"Saved the OCP profile to {prefix}.json and {prefix}.collapsed")
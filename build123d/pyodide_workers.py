@@ -0,0 +1,402 @@
+"""A concurrent.futures executor that runs tasks in a pool of Pyodide workers (web workers, or Node's worker_threads).
+
+Each worker is a separate Pyodide interpreter, bootstrapped once (with bootstrap_in_pyodide.bootstrap) and reused for
+all the tasks of the executor, so that batch jobs (e.g. generating and exporting hundreds of parametric variants) run
+on all cores. Tasks and results are pickled, and the bytes are transferred (not copied) between threads.
+
+Like the spawn start method of multiprocessing, the workers run the main script again (as `__mp_main__`, so guard the
+code with `if __name__ == "__main__":`) to find the functions defined there. Other functions must be importable in
+the workers (e.g. from packages installed with `extra_packages`).
+
+Pyodide can't block its only thread waiting for a worker, so await the futures (`await asyncio.wrap_future(future)`).
+`future.result()` and `executor.map` only work where Pyodide can suspend (JSPI, see pyodide.ffi.can_run_sync).
+
+The workers load Pyodide from index_url: by default, the same version from the CDN in browsers and PYODIDE_INDEX_URL
+(the directory of the Pyodide distribution) on Node, which can't load it from a URL.
+
+Run `PYODIDE_INDEX_URL=$(dirname $(realpath .venv-pyodide/bin/python))/ python pyodide_workers.py [workers]` inside
+a `pyodide venv` to measure the speedup headlessly on Node (natively, the same code runs on a ProcessPoolExecutor, see
+crossplatformtricks.worker_pool_executor).
+"""
+import asyncio
+import collections
+import concurrent.futures
+import itertools
+import os
+import pickle
+import sys
+import traceback
+
+# Runs in each worker: loads Pyodide, runs the Python code below to bootstrap it and then runs the tasks one at a time
+_WORKER_JS = r"""
+const isNode = typeof process !== "undefined" && process.release && process.release.name === "node";
+let post, listen;
+if (isNode) {
+  const { parentPort } = require("node:worker_threads");
+  post = (message, transfer) => parentPort.postMessage(message, transfer);
+  listen = (handler) => parentPort.on("message", handler);
+} else {
+  post = (message, transfer) => self.postMessage(message, transfer);
+  listen = (handler) => { self.onmessage = (event) => handler(event.data); };
+}
+
+let runTask = null;
+listen(async (message) => {
+  if (message.type === "init") {
+    try {
+      const config = message.config;
+      let loadPyodide;
+      if (isNode) {
+        const indexPath = config.indexURL.startsWith("file:") ?
+          require("node:url").fileURLToPath(config.indexURL) : config.indexURL;
+        loadPyodide = require(indexPath + "pyodide.js").loadPyodide;
+      } else {
+        importScripts(config.indexURL + "pyodide.js");
+        loadPyodide = self.loadPyodide;
+      }
+      const pyodide = await loadPyodide({ indexURL: config.indexURL });
+      await pyodide.loadPackage("micropip");
+      pyodide.runPython(config.workerSource);
+      await pyodide.globals.get("_setup")(config);
+      runTask = pyodide.globals.get("_run_task");
+      post({ type: "ready" });
+    } catch (e) {
+      post({ type: "error", error: String((e && e.stack) || e) });
+    }
+  } else if (message.type === "task") {
+    const [ok, payload] = await runTask(message.payload);
+    post({ type: "result", id: message.id, ok, payload }, [payload.buffer]);
+  }
+});
+"""
+
+_WORKER_PY = r"""
+import inspect
+import pickle
+import sys
+import traceback
+import types
+
+from pyodide.ffi import to_js
+
+
+async def _setup(config):
+    bootstrap_module = types.ModuleType("bootstrap_in_pyodide")
+    exec(compile(config.bootstrapSource, "bootstrap_in_pyodide.py", "exec"), bootstrap_module.__dict__)
+    sys.modules["bootstrap_in_pyodide"] = bootstrap_module
+    await bootstrap_module.bootstrap(**config.bootstrapKwargs.to_py())
+    if config.extraPackages.length:
+        import micropip
+        await micropip.install(list(config.extraPackages))
+    if config.mainSource is not None:  # Like multiprocessing's spawn, to find the functions of the main script
+        main_module = types.ModuleType("__mp_main__")
+        main_module.__file__ = config.mainFile
+        sys.modules["__mp_main__"] = main_module
+        exec(compile(config.mainSource, config.mainFile, "exec"), main_module.__dict__)
+        sys.modules["__main__"] = main_module
+    if config.initializer is not None:
+        initializer, initargs = pickle.loads(config.initializer.to_bytes())
+        initializer(*initargs)
+
+
+async def _run_task(payload):
+    try:
+        fn, args, kwargs = pickle.loads(payload.to_bytes())
+        result = fn(*args, **kwargs)
+        if inspect.isawaitable(result):
+            result = await result
+        return to_js([True, pickle.dumps(result)])
+    except BaseException as e:
+        try:
+            error = pickle.dumps((e, traceback.format_exc()))
+        except Exception:  # Unpicklable exception
+            error = pickle.dumps((RuntimeError(repr(e)), traceback.format_exc()))
+        return to_js([False, error])
+"""
+
+
+class _RemoteTraceback(Exception):
+    """The traceback of an exception raised by a task in a worker (set as the __cause__ of the exception)."""
+
+    def __init__(self, tb):
+        super().__init__(tb)
+        self.tb = tb
+
+    def __str__(self):
+        return self.tb
+
+
+class _Future(concurrent.futures.Future):
+    def result(self, timeout=None):
+        _wait(self)
+        return super().result(timeout)
+
+    def exception(self, timeout=None):
+        _wait(self)
+        return super().exception(timeout)
+
+
+def _wait(future):
+    """Waits for the future without blocking the only thread, which would never receive the result."""
+    if future.done():
+        return
+    from pyodide.ffi import can_run_sync, run_sync
+    if not can_run_sync():
+        raise RuntimeError("Pyodide can't wait for a worker here (no JSPI): await asyncio.wrap_future(future) instead")
+    run_sync(asyncio.wrap_future(future))
+
+
+def _to_js_object(value):
+    import js
+    from pyodide.ffi import to_js
+    return to_js(value, dict_converter=js.Object.fromEntries)
+
+
+def _is_node():
+    import js
+    return hasattr(js, "process") and js.process.release.name == "node"
+
+
+def _node_module(name):
+    """Loads a builtin module of Node (e.g. "node:os") from the main thread."""
+    import js
+    if hasattr(js.process, "getBuiltinModule"):  # Node >= 20.16
+        return js.process.getBuiltinModule(name)
+    if hasattr(js, "require"):  # Pyodide loaded from CommonJS
+        return js.require(name)
+    from pyodide.ffi import can_run_sync, run_sync
+    if can_run_sync():
+        return run_sync(js.Function.new("name", "return import(name)")(name))
+    raise RuntimeError(f"Can't load {name} from Pyodide with this version of Node (20.16 or newer can)")
+
+
+def _default_index_url():
+    index_url = os.environ.get("PYODIDE_INDEX_URL")
+    if index_url:
+        return index_url if index_url.endswith("/") else index_url + "/"
+    if _is_node():
+        raise ValueError("Set PYODIDE_INDEX_URL (or pass index_url) to the directory of the Pyodide distribution")
+    import pyodide_js
+    return f"https://cdn.jsdelivr.net/pyodide/v{pyodide_js.version}/full/"
+
+
+def default_workers():
+    import js
+    if hasattr(js, "navigator") and js.navigator.hardwareConcurrency:
+        return int(js.navigator.hardwareConcurrency)
+    if _is_node():
+        try:
+            node_os = _node_module("node:os")
+        except RuntimeError:
+            return 4
+        if hasattr(node_os, "availableParallelism"):  # Node >= 18.14
+            return int(node_os.availableParallelism())
+        return int(node_os.cpus().length)
+    return 4
+
+
+class PyodideWorkerPoolExecutor(concurrent.futures.Executor):
+    """Runs the submitted calls in max_workers Pyodide workers (one at a time in each), which are started on the first
+    submission and bootstrapped with bootstrap_kwargs (see bootstrap_in_pyodide.bootstrap).
+
+    The initializer (called with initargs in each worker after its bootstrap) and the extra packages (installed with
+    micropip) can prepare the workers for the tasks, like ProcessPoolExecutor's initializer."""
+
+    def __init__(self, max_workers=None, bootstrap_kwargs=None, initializer=None, initargs=(), extra_packages=(),
+                 index_url=None):
+        if max_workers is not None and max_workers <= 0:
+            raise ValueError("max_workers must be greater than 0")
+        import bootstrap_in_pyodide
+        self._max_workers = max_workers or default_workers()
+        with open(bootstrap_in_pyodide.__file__) as f:
+            bootstrap_source = f.read()
+        main_module = sys.modules.get("__main__")
+        main_file = getattr(main_module, "__file__", None)
+        main_source = None
+        if main_file is not None and os.path.isfile(main_file):
+            with open(main_file) as f:
+                main_source = f.read()
+        self._config = _to_js_object({
+            "indexURL": index_url or _default_index_url(),
+            "workerSource": _WORKER_PY,
+            "bootstrapSource": bootstrap_source,
+            "bootstrapKwargs": bootstrap_kwargs or {},
+            "extraPackages": list(extra_packages),
+            "mainFile": main_file,
+            "mainSource": main_source,
+            "initializer": pickle.dumps((initializer, initargs)) if initializer is not None else None,
+        })
+        self._ids = itertools.count()
+        self._pending = collections.deque()  # (id, future, payload) not sent to a worker yet
+        self._running = {}  # worker index -> (id, future)
+        self._idle = []  # Indices of the bootstrapped workers without a task
+        self._workers = []  # JS workers (and their message handlers, kept alive)
+        self._bootstrapped = 0
+        self._all_bootstrapped = _Future()
+        self._broken = None
+        self._shutdown = False
+
+    def submit(self, fn, /, *args, **kwargs):
+        if self._broken is not None:
+            raise concurrent.futures.BrokenExecutor(self._broken)
+        if self._shutdown:
+            raise RuntimeError("cannot schedule new futures after shutdown")
+        future = _Future()
+        self._pending.append((next(self._ids), future, pickle.dumps((fn, args, kwargs))))
+        if not self._workers:
+            self._start_workers()
+        self._dispatch()
+        return future
+
+    def warm_up(self):
+        """Starts the workers now (instead of on the first submission) and returns a future that is done once all of
+        them are bootstrapped, e.g. to time the tasks without the bootstraps."""
+        if self._broken is not None:
+            raise concurrent.futures.BrokenExecutor(self._broken)
+        if not self._workers and not self._shutdown:
+            self._start_workers()
+        return self._all_bootstrapped
+
+    def _start_workers(self):
+        from pyodide.ffi import create_proxy, to_js
+        import js
+        node = _is_node()
+        if node:
+            worker_threads = _node_module("node:worker_threads")
+        else:
+            blob = js.Blob.new(to_js([_WORKER_JS]), _to_js_object({"type": "text/javascript"}))
+            url = js.URL.createObjectURL(blob)
+        for index in range(self._max_workers):
+            if node:
+                worker = worker_threads.Worker.new(_WORKER_JS, _to_js_object({"eval": True}))
+                on_message = create_proxy(lambda message, index=index: self._on_message(index, message))
+                on_error = create_proxy(lambda error, index=index: self._on_error(index, str(error)))
+                worker.on("message", on_message)
+                worker.on("error", on_error)
+            else:
+                worker = js.Worker.new(url)
+                on_message = create_proxy(lambda event, index=index: self._on_message(index, event.data))
+                on_error = create_proxy(lambda event, index=index: self._on_error(index, str(event.message)))
+                worker.onmessage = on_message
+                worker.onerror = on_error
+            worker.postMessage(_to_js_object({"type": "init", "config": self._config}))
+            self._workers.append((worker, on_message, on_error))
+
+    def _dispatch(self):
+        while self._pending and self._idle:
+            task_id, future, payload = self._pending.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            index = self._idle.pop()
+            self._running[index] = (task_id, future)
+            worker = self._workers[index][0]
+            if _is_node():
+                worker.ref()  # Keep the process alive until the result arrives
+            from pyodide.ffi import to_js
+            buffer = to_js(payload)
+            message = _to_js_object({"type": "task", "id": task_id, "payload": buffer})
+            worker.postMessage(message, to_js([buffer.buffer]))  # Transferred, not copied
+        if self._shutdown and not self._pending and not self._running:
+            self._terminate()
+
+    def _on_message(self, index, message):
+        if message.type == "ready":
+            self._idle.append(index)
+            self._bootstrapped += 1
+            if self._bootstrapped == self._max_workers and not self._all_bootstrapped.done():
+                self._all_bootstrapped.set_result(None)
+        elif message.type == "error":
+            self._on_error(index, f"Could not bootstrap a worker:\n{message.error}")
+            return
+        elif message.type == "result":
+            task_id, future = self._running.pop(index)
+            if message.ok:
+                future.set_result(pickle.loads(message.payload.to_bytes()))
+            else:
+                exception, tb = pickle.loads(message.payload.to_bytes())
+                exception.__cause__ = _RemoteTraceback(tb)
+                future.set_exception(exception)
+            self._idle.append(index)
+        if _is_node() and index in self._idle:
+            self._workers[index][0].unref()  # Idle workers must not keep the process alive
+        self._dispatch()
+
+    def _on_error(self, index, error):
+        """A worker crashed (or could not bootstrap): like a ProcessPoolExecutor, the executor can't be used anymore."""
+        self._broken = error
+        exception = concurrent.futures.BrokenExecutor(f"A worker of the pool failed: {error}")
+        if not self._all_bootstrapped.done():
+            self._all_bootstrapped.set_exception(exception)
+        for task_id, future in list(self._running.values()):
+            future.set_exception(exception)
+        while self._pending:
+            task_id, future, payload = self._pending.popleft()
+            if future.set_running_or_notify_cancel():
+                future.set_exception(exception)
+        self._running.clear()
+        self._terminate()
+
+    def _terminate(self):
+        for worker, on_message, on_error in self._workers:
+            worker.terminate()
+            on_message.destroy()
+            on_error.destroy()
+        self._workers = []
+        self._idle = []
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        """Terminates the workers once all tasks finish (waiting for them if wait and Pyodide can suspend)."""
+        self._shutdown = True
+        if cancel_futures:
+            while self._pending:
+                self._pending.popleft()[1].cancel()
+        futures = [future for _, future in self._running.values()] + [future for _, future, _ in self._pending]
+        self._dispatch()
+        if wait:
+            from pyodide.ffi import can_run_sync
+            if can_run_sync():
+                for future in futures:
+                    _wait(future)
+
+
+def _make_variant(size):
+    """A parametric variant (a filleted box with a hole) exported as STEP."""
+    import tempfile
+    from build123d import Box, Cylinder, export_step, fillet
+    part = Box(size, size, size) - Cylinder(size / 4, size * 2)
+    part = fillet(part.edges(), radius=size / 10)
+    path = os.path.join(tempfile.mkdtemp(), "variant.step")
+    assert export_step(part, path)
+    return os.path.getsize(path)
+
+
+async def _main():
+    import json
+    import time
+    from crossplatformtricks import bootstrap, worker_pool_executor
+    await bootstrap()
+    sizes = [10 + i for i in range(32)]
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+
+    start = time.perf_counter()
+    sequential = [_make_variant(size) for size in sizes]
+    sequential_seconds = time.perf_counter() - start
+
+    executor = worker_pool_executor(workers)
+    if hasattr(executor, "warm_up"):  # Wait for all the workers to be bootstrapped
+        await asyncio.wrap_future(executor.warm_up())
+    else:  # A ProcessPoolExecutor (natively) starts a process for each task submitted while the others are busy
+        warm_up = [executor.submit(_make_variant, sizes[0]) for _ in range(workers or os.cpu_count())]
+        await asyncio.gather(*(asyncio.wrap_future(future) for future in warm_up))
+    start = time.perf_counter()
+    parallel = await asyncio.gather(*(asyncio.wrap_future(executor.submit(_make_variant, size)) for size in sizes))
+    parallel_seconds = time.perf_counter() - start
+    executor.shutdown(wait=False)
+    assert list(parallel) == sequential
+    print(json.dumps({"platform": sys.platform, "variants": len(sizes),
+                      "sequential_seconds": round(sequential_seconds, 3), "parallel_seconds": round(parallel_seconds, 3),
+                      "speedup": round(sequential_seconds / parallel_seconds, 2)}, indent=1))
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,81 @@
+"""Pytest plugin (loaded with `-p sharding`) that splits the tests into shards and records the duration of each test.
+
+The assignment is deterministic, so that every process (each Pyodide worker, or each xdist worker of a native run)
+selects the same tests on its own: tests are balanced by their durations in previous runs (--shard-durations), with
+unknown tests counted as average ones.
+"""
+import json
+
+import pytest
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("sharding")
+    group.addoption("--shard", default=None, help="only run shard INDEX/COUNT (1-based) of the tests, e.g. 2/4")
+    group.addoption("--shard-durations", action="append", default=[],
+                    help="JSON file(s) of test durations (from --save-durations) to balance the shards with")
+    group.addoption("--save-durations", default=None, help="save the duration of each test to this JSON file")
+
+
+def parse_shard(shard):
+    try:
+        index, count = (int(part) for part in shard.split("/"))
+    except ValueError:
+        raise pytest.UsageError(f"Invalid shard {shard!r}, expected INDEX/COUNT (e.g. 2/4)")
+    if not 1 <= index <= count:
+        raise pytest.UsageError(f"Invalid shard {shard!r}, the index must be between 1 and the count")
+    return index, count
+
+
+def pytest_configure(config):
+    if config.getoption("shard") is not None:
+        parse_shard(config.getoption("shard"))  # Fail early on invalid shards
+
+
+def assign_shards(nodeids, count, durations):
+    """Maps each test to a shard (0-based): the longest first to the least loaded shard, which is deterministic."""
+    known = [durations[nodeid] for nodeid in nodeids if nodeid in durations]
+    default = sum(known) / len(known) if known else 1.0
+    loads = [0.0] * count
+    assignment = {}
+    for nodeid in sorted(nodeids, key=lambda nodeid: (-durations.get(nodeid, default), nodeid)):
+        shard = min(range(count), key=lambda shard: (loads[shard], shard))
+        assignment[nodeid] = shard
+        loads[shard] += durations.get(nodeid, default)
+    return assignment
+
+
+def load_durations(paths):
+    durations = {}
+    for path in paths:
+        with open(path) as f:
+            durations.update(json.load(f))
+    return durations
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("shard") is None:
+        return
+    index, count = parse_shard(config.getoption("shard"))
+    assignment = assign_shards([item.nodeid for item in items], count,
+                               load_durations(config.getoption("shard_durations")))
+    selected = [item for item in items if assignment[item.nodeid] == index - 1]
+    deselected = [item for item in items if assignment[item.nodeid] != index - 1]
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+    items[:] = selected
+
+
+_durations = {}
+
+
+def pytest_runtest_logreport(report):
+    # Setup, call and teardown (also received from xdist workers)
+    _durations[report.nodeid] = _durations.get(report.nodeid, 0.0) + report.duration
+
+
+def pytest_sessionfinish(session):
+    path = session.config.getoption("save_durations")
+    if path is not None and not hasattr(session.config, "workerinput"):  # Only once, on the xdist controller
+        with open(path, "w") as f:
+            json.dump(dict(sorted(_durations.items())), f, indent=1)
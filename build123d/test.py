@@ -1,6 +1,6 @@
 async def download_and_patch_build123d(tag_or_branch: str):
-    from crossplatformtricks import bootstrap, install_package, common_fetch
-    import zipfile, io, tempfile, os, sys, re
+    from crossplatformtricks import bootstrap, install_packages, fetch_to_file
+    import zipfile, tempfile, os, sys, re
 
     await bootstrap()
 
@@ -9,12 +9,12 @@ async def download_and_patch_build123d(tag_or_branch: str):
     if sys.platform == "emscripten": sources_url = "https://little-hill-4bc4.yeicor-cloudflare.workers.dev/?url=" + sources_url
     version = '0.0.0+dev' if tag_or_branch == "dev" else tag_or_branch.strip("v")
     print(f"Running tests for build123d {version} from: {sources_url}")
-    sources_bytes = await common_fetch(sources_url)
+    sources_path = await fetch_to_file(sources_url)  # Cached on disk across runs
 
     # Extract it to a temporary directory
     _tmpdir = tempfile.TemporaryDirectory()
     # noinspection PyTypeChecker
-    with zipfile.ZipFile(file=io.BytesIO(sources_bytes), mode="r") as zipf:
+    with zipfile.ZipFile(file=sources_path, mode="r") as zipf:
         zipf.extractall(path=_tmpdir.name)
 
     # Locate the extracted directory (assuming the zip contains a single top-level directory)
@@ -55,11 +55,9 @@ async def download_and_patch_build123d(tag_or_branch: str):
         if sys.platform == "emscripten": 
             _dependencies += ["sqlite3"]  # sqlite3 is not included by default in Pyodide
             _dependencies.remove("mypy")  # mypy is not compatible with Pyodide
-    for dep in _dependencies:
-        dep = dep.strip()
-        if dep:
-            print(f"Installing dependency: {dep}")
-            await install_package(dep)
+    _dependencies = [dep.strip() for dep in _dependencies if dep.strip()]
+    print(f"Installing dependencies: {', '.join(_dependencies)}")
+    await install_packages(_dependencies)  # All at once, so that they are resolved together and installed concurrently
 
     # Sanity check: import build123d results in a matching version to these patched sources
     import build123d
@@ -84,19 +82,37 @@ async def main():
     parser = argparse.ArgumentParser(description="Download and test build123d package.")
     parser.add_argument("branch", nargs='?', default=default_branch,
                         help="The branch of build123d to test (default: dev).")
+    parser.add_argument("--shard", default=os.environ.get("BUILD123D_SHARD"),
+                        help="Only run shard INDEX/COUNT of the tests, e.g. one per Pyodide worker (see sharding.py).")
+    parser.add_argument("--workers", default=os.environ.get("BUILD123D_WORKERS", "1"),
+                        help="Number of parallel test processes, or 'auto' for one per core (native only).")
+    parser.add_argument("--shard-durations", action="append", default=[],
+                        help="Durations of a previous run (see --save-durations) to balance the shards with.")
+    parser.add_argument("--save-durations", default=None, help="Save the duration of each test to this JSON file.")
     args = parser.parse_args()
+    if args.workers != "1" and sys.platform == "emscripten":
+        parser.error("--workers is not supported under Pyodide, run a --shard in each worker instead")
 
     old_cwd = os.getcwd()
     tmpdir = None
     try:
         extracted_dir, tmpdir = await download_and_patch_build123d(args.branch)
 
+        shard_args = ["-p", "sharding", "--durations=25"]  # Also report the slowest tests
+        if args.shard: shard_args.append(f"--shard={args.shard}")
+        shard_args += [f"--shard-durations={os.path.abspath(path)}" for path in args.shard_durations]
+        if args.save_durations: shard_args.append(f"--save-durations={os.path.abspath(args.save_durations)}")
+
         # Set the working directory so relative paths work
         os.chdir(extracted_dir)
 
         # Discover and run all tests
+        if args.workers != "1":  # With pytest-xdist (a development dependency), whose workers need the same sys.path
+            shard_args += [f"--numprocesses={args.workers}"]
+            os.environ["PYTHONPATH"] = os.pathsep.join([os.path.join(extracted_dir, "src"), os.path.dirname(
+                os.path.abspath(__file__)), os.environ.get("PYTHONPATH", "")])
         import pytest
-        exit_code = pytest.main([
+        exit_code = pytest.main(shard_args + [
             "-v",
             # "--benchmark-disable", # These are somewhat slow, but they work
             # VTK is not compiled, so the following visualization tests must be disabled
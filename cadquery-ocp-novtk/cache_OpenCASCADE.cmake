@@ -0,0 +1,75 @@
+# Stores the OCCT toolkits and headers built by CMakeLists.txt in its persistent cache (see OCCT_CACHE_DIR there),
+# keeping only the OCCT_CACHE_MAX_ENTRIES most recently used entries
+if(NOT DEFINED OCCT_CACHE_ENTRY)
+  message(FATAL_ERROR "OCCT_CACHE_ENTRY must be defined")
+endif()
+if(NOT DEFINED OCCT_CACHE_MAX_ENTRIES)
+  message(FATAL_ERROR "OCCT_CACHE_MAX_ENTRIES must be defined")
+endif()
+if(NOT DEFINED MANIFEST)
+  message(FATAL_ERROR "MANIFEST must be defined")
+endif()
+if(NOT DEFINED INCLUDE_DIR)
+  message(FATAL_ERROR "INCLUDE_DIR must be defined")
+endif()
+if(NOT DEFINED TOOLKIT_FILES)
+  message(FATAL_ERROR "TOOLKIT_FILES must be defined")
+endif()
+
+if(EXISTS "${OCCT_CACHE_ENTRY}/manifest.cmake")
+  return()
+endif()
+message(STATUS "Storing prebuilt OCCT in ${OCCT_CACHE_ENTRY}")
+file(REMOVE_RECURSE "${OCCT_CACHE_ENTRY}") # Incomplete (no manifest), e.g. partially evicted
+
+# Work in a temporary directory, so that interrupted (or concurrent) builds never leave an incomplete entry behind
+string(RANDOM LENGTH 8 tmp_suffix)
+set(tmp_entry "${OCCT_CACHE_ENTRY}.tmp-${tmp_suffix}")
+file(REMOVE_RECURSE "${tmp_entry}")
+file(MAKE_DIRECTORY "${tmp_entry}/lib" "${tmp_entry}/include/opencascade")
+
+# The headers in the build tree may just include the ones in the (uncached) sources, so copy the real ones
+file(GLOB headers LIST_DIRECTORIES false "${INCLUDE_DIR}/*")
+foreach(header IN LISTS headers)
+  get_filename_component(header_name "${header}" NAME)
+  file(READ "${header}" content LIMIT 4096)
+  if(content MATCHES "^#include \"([^\"]+)\"[ \t\r\n]*$" AND EXISTS "${CMAKE_MATCH_1}")
+    set(header "${CMAKE_MATCH_1}")
+  endif()
+  file(COPY_FILE "${header}" "${tmp_entry}/include/opencascade/${header_name}")
+endforeach()
+
+file(READ "${MANIFEST}" manifest)
+string(REPLACE "," ";" toolkit_files "${TOOLKIT_FILES}")
+foreach(toolkit_file IN LISTS toolkit_files)
+  string(REGEX MATCH "^([^=]+)=(.*)$" _ "${toolkit_file}")
+  get_filename_component(library_name "${CMAKE_MATCH_2}" NAME)
+  file(COPY_FILE "${CMAKE_MATCH_2}" "${tmp_entry}/lib/${library_name}")
+  string(APPEND manifest "set(OCCT_TOOLKIT_LIBRARY_${CMAKE_MATCH_1} \"lib/${library_name}\")\n")
+endforeach()
+file(WRITE "${tmp_entry}/manifest.cmake" "${manifest}") # Last, as it marks the entry as complete
+
+file(RENAME "${tmp_entry}" "${OCCT_CACHE_ENTRY}" RESULT rename_result)
+if(NOT rename_result EQUAL 0) # Stored concurrently by another build
+  file(REMOVE_RECURSE "${tmp_entry}")
+endif()
+
+# Evict the least recently used entries (their manifests are touched when used)
+get_filename_component(cache_dir "${OCCT_CACHE_ENTRY}" DIRECTORY)
+file(GLOB manifests "${cache_dir}/*/manifest.cmake")
+set(entries "")
+foreach(manifest_file IN LISTS manifests)
+  file(TIMESTAMP "${manifest_file}" used "%s")
+  get_filename_component(entry "${manifest_file}" DIRECTORY)
+  list(APPEND entries "${used}|${entry}")
+endforeach()
+list(SORT entries COMPARE NATURAL ORDER DESCENDING)
+list(LENGTH entries entry_count)
+if(entry_count GREATER OCCT_CACHE_MAX_ENTRIES)
+  list(SUBLIST entries ${OCCT_CACHE_MAX_ENTRIES} -1 evicted)
+  foreach(entry IN LISTS evicted)
+    string(REGEX REPLACE "^[0-9]+\\|" "" entry "${entry}")
+    message(STATUS "Evicting prebuilt OCCT ${entry}")
+    file(REMOVE_RECURSE "${entry}")
+  endforeach()
+endif()
@@ -0,0 +1,42 @@
+"""Measures the time and memory spent on `import OCP` and on the first uses of a few common submodules.
+
+Runs natively or under Pyodide (e.g. `python measure_import.py` inside a `pyodide venv`), where the size of the wasm
+heap is reported instead of the peak RSS. Compare runs with and without OCP_EAGER_MODULES=1 to measure the effect of
+lazy submodule registration.
+"""
+import json
+import os
+import sys
+import time
+
+
+def heap_size():
+    if sys.platform == "emscripten":
+        import pyodide_js
+        return pyodide_js._module.HEAPU8.length
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure(results, phase, fn):
+    start = time.perf_counter()
+    fn()
+    results[phase] = {"seconds": round(time.perf_counter() - start, 4), "heap_bytes": heap_size()}
+
+
+def main():
+    results = {"baseline": {"seconds": 0.0, "heap_bytes": heap_size()}}
+    measure(results, "import OCP", lambda: __import__("OCP"))
+    measure(results, "from OCP.gp import gp_Pnt", lambda: __import__("OCP.gp", fromlist=["gp_Pnt"]).gp_Pnt(1, 2, 3))
+
+    def first_box():
+        from OCP.BRepPrimAPI import BRepPrimAPI_MakeBox
+        from OCP.TopoDS import TopoDS_Shape
+        assert isinstance(BRepPrimAPI_MakeBox(1.0, 2.0, 3.0).Shape(), TopoDS_Shape)
+
+    measure(results, "first box", first_box)
+    print(json.dumps({"eager": bool(os.environ.get("OCP_EAGER_MODULES")), "phases": results}, indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Measures the speedup of OCCT's parallel algorithms (meshing and booleans) over their sequential versions.
+
+Only the multithreaded build (the pthreads wheel, not published yet) should show speedups under Pyodide, where OCCT's
+threads are web workers (or worker_threads under Node, e.g. `python measure_parallel.py` inside a `pyodide venv` created
+from a pthreads-enabled Pyodide). Natively, any build shows the expected speedups. Pass the number of threads of
+OCCT's default pool as the first argument (defaults to the number of logical processors).
+"""
+import json
+import sys
+import time
+
+
+def make_workload(count):
+    """A grid of count x count filleted boxes with a sphere cut into each, plus a sphere at a corner of each to fuse."""
+    from OCP.BRepAlgoAPI import BRepAlgoAPI_Cut
+    from OCP.BRepFilletAPI import BRepFilletAPI_MakeFillet
+    from OCP.BRepPrimAPI import BRepPrimAPI_MakeBox, BRepPrimAPI_MakeSphere
+    from OCP.TopAbs import TopAbs_EDGE
+    from OCP.TopExp import TopExp_Explorer
+    from OCP.TopTools import TopTools_ListOfShape
+    from OCP.TopoDS import TopoDS
+    from OCP.gp import gp_Pnt
+
+    arguments, tools = TopTools_ListOfShape(), TopTools_ListOfShape()
+    for i in range(count):
+        for j in range(count):
+            box = BRepPrimAPI_MakeBox(gp_Pnt(i * 12.0, j * 12.0, 0.0), 10.0, 10.0, 10.0).Shape()
+            fillet = BRepFilletAPI_MakeFillet(box)
+            explorer = TopExp_Explorer(box, TopAbs_EDGE)
+            while explorer.More():
+                fillet.Add(1.0, TopoDS.Edge_s(explorer.Current()))
+                explorer.Next()
+            sphere = BRepPrimAPI_MakeSphere(gp_Pnt(i * 12.0 + 5.0, j * 12.0 + 5.0, 10.0), 4.0).Shape()
+            arguments.Append(BRepAlgoAPI_Cut(fillet.Shape(), sphere).Shape())
+            tools.Append(BRepPrimAPI_MakeSphere(gp_Pnt(i * 12.0 + 10.0, j * 12.0 + 10.0, 5.0), 3.0).Shape())
+    return arguments, tools
+
+
+def fuse(arguments, tools, parallel):
+    from OCP.BRepAlgoAPI import BRepAlgoAPI_Fuse
+    operation = BRepAlgoAPI_Fuse()
+    operation.SetArguments(arguments)
+    operation.SetTools(tools)
+    operation.SetRunParallel(parallel)
+    operation.Build()
+    assert operation.IsDone()
+    return operation.Shape()
+
+
+def mesh(shape, parallel):
+    from OCP.BRepMesh import BRepMesh_IncrementalMesh
+    from OCP.BRepTools import BRepTools
+    BRepTools.Clean_s(shape)  # Mesh from scratch every time
+    assert BRepMesh_IncrementalMesh(shape, 0.01, False, 0.1, parallel).IsDone()
+
+
+def measure(fn, parallel, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(parallel)
+        best = min(best, time.perf_counter() - start)
+    return round(best, 4)
+
+
+def main():
+    from OCP.OSD import OSD_Parallel, OSD_ThreadPool
+    if len(sys.argv) > 1:
+        OSD_ThreadPool.DefaultPool_s(int(sys.argv[1]))  # Only the first call sizes the pool
+
+    arguments, tools = make_workload(4)
+    fused = fuse(arguments, tools, False)
+    workloads = {
+        "BRepAlgoAPI_Fuse": lambda parallel: fuse(arguments, tools, parallel),
+        "BRepMesh_IncrementalMesh": lambda parallel: mesh(fused, parallel),
+    }
+
+    results = {}
+    for name, fn in workloads.items():
+        sequential, parallel = measure(fn, False), measure(fn, True)
+        results[name] = {"sequential_seconds": sequential, "parallel_seconds": parallel,
+                         "speedup": round(sequential / parallel, 2)}
+    print(json.dumps({"platform": sys.platform, "logical_processors": OSD_Parallel.NbLogicalProcessors_s(),
+                      "pool_threads": OSD_ThreadPool.DefaultPool_s().NbThreads(), "workloads": results}, indent=1))
+
+
+if __name__ == "__main__":
+    main()
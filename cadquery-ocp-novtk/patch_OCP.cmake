@@ -36,15 +36,808 @@ foreach(f IN LISTS vtk_and_opengl_sources)
 endforeach()
 
 # ----- Modify OCP.cpp -----
+# Always start from the original OCP.cpp, so that the same sources can be re-patched with different options
 set(ocp_cpp "${REAL_SOURCE_DIR}/OCP.cpp")
+if(EXISTS "${ocp_cpp}.orig")
+  file(COPY_FILE "${ocp_cpp}.orig" "${ocp_cpp}")
+else()
+  file(READ "${ocp_cpp}" content)
+  if(content MATCHES "namespace ocp_lazy")
+    message(FATAL_ERROR "${ocp_cpp} was patched by an older version of this script, remove the OCP sources to refetch them")
+  endif()
+  file(COPY_FILE "${ocp_cpp}" "${ocp_cpp}.orig")
+endif()
 file(READ "${ocp_cpp}" content)
 set(content_old "${content}")
 string(REGEX REPLACE "(\n)([^/\n]+register_[^\n]*([vV][tT][kK]|OpenGl)[^\n]*)" "\\1/*\\2*/" content "${content}")
+
+# Modules outside of the OCP profile (see CMakeLists.txt) are not built: their sources are renamed instead of removed,
+# so they come back if the profile changes
+file(GLOB pruned_sources "${REAL_SOURCE_DIR}/*.cpp.pruned")
+foreach(f IN LISTS pruned_sources)
+  string(REGEX REPLACE "\\.pruned$" "" f_original "${f}")
+  file(RENAME "${f}" "${f_original}")
+endforeach()
+string(REPLACE "," ";" pruned_modules "${OCP_PRUNED_MODULES}")
+set(pruned_count 0)
+foreach(module IN LISTS pruned_modules)
+  if(EXISTS "${REAL_SOURCE_DIR}/${module}.cpp")
+    foreach(f "${REAL_SOURCE_DIR}/${module}.cpp" "${REAL_SOURCE_DIR}/${module}_pre.cpp")
+      if(EXISTS "${f}")
+        file(RENAME "${f}" "${f}.pruned")
+      endif()
+    endforeach()
+    string(REGEX REPLACE "(\n)([^/\n]+register_${module}(_enums)?\\([^\n]*)" "\\1/*\\2*/" content "${content}")
+    math(EXPR pruned_count "${pruned_count} + 1")
+  endif()
+endforeach()
+if(pruned_count GREATER 0)
+  message(STATUS "Pruned ${pruned_count} OCP modules")
+  # Bound modules must not use the types of pruned ones (see the lazy dependencies below for how they are found), as
+  # pybind11 would fail to register them (unknown base types or default values) when they are imported
+  foreach(module IN LISTS pruned_modules)
+    set(is_pruned_${module} TRUE)
+  endforeach()
+  string(REGEX MATCHALL "\n[ \t]*register_[A-Za-z0-9]+_enums\\(m\\)" bound_calls "${content}")
+  set(pruned_uses "")
+  foreach(call IN LISTS bound_calls)
+    string(REGEX REPLACE "\n[ \t]*register_([A-Za-z0-9]+)_enums\\(m\\)" "\\1" module "${call}")
+    set(module_lines "")
+    foreach(src "${REAL_SOURCE_DIR}/${module}.cpp" "${REAL_SOURCE_DIR}/${module}_pre.cpp")
+      if(EXISTS "${src}")
+        file(STRINGS "${src}" lines REGEX "^#include <|py::class_<|\\.def|py::arg|py::init|static_cast<")
+        string(APPEND module_lines "${lines}")
+      endif()
+    endforeach()
+    string(REGEX MATCHALL "[A-Za-z][A-Za-z0-9]*(_|::)" prefixes "${module_lines}")
+    list(REMOVE_DUPLICATES prefixes)
+    foreach(prefix IN LISTS prefixes)
+      string(REGEX REPLACE "(_|::)$" "" dep "${prefix}")
+      if(is_pruned_${dep})
+        list(APPEND pruned_uses "${module} -> ${dep}")
+      endif()
+    endforeach()
+  endforeach()
+  if(pruned_uses)
+    string(REPLACE ";" ", " pruned_uses "${pruned_uses}")
+    message(WARNING "Bound OCP modules use pruned ones, which will fail to import: ${pruned_uses}")
+  endif()
+endif()
 if(NOT content STREQUAL content_old)
   file(WRITE "${ocp_cpp}" "${content}")
   message(STATUS "Patched OCP.cpp")
 endif()
 
+# ----- NumPy array accessors for meshes -----
+# Reading triangulations node by node (Node(i), Triangle(i)...) crosses the binding layer once per element, which is
+# very slow in wasm. Poly_Triangulation gets NodesArray/UVNodesArray/NormalsArray/TrianglesArray returning read-only
+# views of OCCT's own memory, and BRepMesh_TriangulationArrays(shape) gathers the meshes of all faces of a shape at once.
+function(append_module_extension module_name marker code)
+  set(module_cpp "${REAL_SOURCE_DIR}/${module_name}.cpp")
+  if(NOT EXISTS "${module_cpp}")
+    message(WARNING "${module_cpp} not found, skipping ${marker}")
+    return()
+  endif()
+  file(READ "${module_cpp}" content)
+  string(FIND "${content}" "${marker}" _already_patched)
+  string(FIND "${content}" "register_${module_name}_generated" _already_wrapped)
+  string(REGEX MATCH "\nvoid register_${module_name}\\(([^)]*)\\)[ \t\r\n]*{" register_start "${content}")
+  if(NOT _already_patched EQUAL -1)
+    return()
+  elseif(NOT _already_wrapped EQUAL -1) # Another extension of the same module: also call it from the wrapper
+    string(REPLACE "\nvoid register_${module_name}(py::module &main_module) {" "
+static void ${marker}(py::module &main_module);
+void register_${module_name}(py::module &main_module) {" content "${content}")
+    string(REGEX REPLACE "(\n}\nstatic void register_${module_name}_generated\\()" "\n    ${marker}(main_module);\\1"
+           content "${content}")
+    file(WRITE "${module_cpp}" "${content}\n${code}")
+    message(STATUS "Patched ${module_name}.cpp (${marker})")
+    return()
+  elseif(NOT register_start)
+    message(WARNING "Unexpected ${module_cpp} structure, skipping ${marker}")
+    return()
+  endif()
+  string(REPLACE "${register_start}" "
+static void ${marker}(py::module &main_module);
+static void register_${module_name}_generated(${CMAKE_MATCH_1});
+void register_${module_name}(py::module &main_module) {
+    register_${module_name}_generated(main_module);
+    ${marker}(main_module);
+}
+static void register_${module_name}_generated(${CMAKE_MATCH_1}) {" content "${content}")
+  file(WRITE "${module_cpp}" "${content}\n${code}")
+  message(STATUS "Patched ${module_name}.cpp (${marker})")
+endfunction()
+
+append_module_extension(Poly register_Poly_arrays [==[
+// ----- NumPy views of triangulations (see patch_OCP.cmake) -----
+#include <pybind11/numpy.h>
+#include <Poly_Triangulation.hxx>
+
+// Read-only (rows, columns) view of OCCT memory, which keeps the owner (the triangulation) alive
+template <typename T>
+static py::array read_only_view(py::handle owner, const void *data, py::ssize_t rows, py::ssize_t columns,
+                                py::ssize_t row_stride) {
+    if (rows == 0) return py::array_t<T>(std::vector<py::ssize_t>{0, columns});
+    py::array_t<T> view({rows, columns}, {row_stride, static_cast<py::ssize_t>(sizeof(T))},
+                        static_cast<const T *>(data), owner);
+    view.attr("setflags")(py::arg("write") = false);
+    return view;
+}
+
+static void register_Poly_arrays(py::module &main_module) {
+    py::module m = static_cast<py::module>(main_module.attr("Poly"));
+    py::object cls = m.attr("Poly_Triangulation");
+    py::setattr(cls, "NodesArray", py::cpp_function([](py::object self) -> py::array {
+        Poly_Triangulation &tri = self.cast<Poly_Triangulation &>();
+        const NCollection_AliasedArray<> &nodes = tri.InternalNodes();
+        if (tri.InternalNodes().IsDoublePrecision()) {
+            return read_only_view<double>(self, nodes.IsEmpty() ? nullptr : &nodes.Value<gp_Pnt>(0),
+                                          nodes.Size(), 3, nodes.Stride());
+        }
+        return read_only_view<float>(self, nodes.IsEmpty() ? nullptr : &nodes.Value<gp_Vec3f>(0),
+                                     nodes.Size(), 3, nodes.Stride());
+    }, py::is_method(cls), py::name("NodesArray"), "Returns a read-only (NbNodes, 3) view of the nodes (no copies)"));
+    py::setattr(cls, "UVNodesArray", py::cpp_function([](py::object self) -> py::object {
+        Poly_Triangulation &tri = self.cast<Poly_Triangulation &>();
+        if (!tri.HasUVNodes()) return py::none();
+        const NCollection_AliasedArray<> &uvs = tri.InternalUVNodes();
+        if (tri.InternalUVNodes().IsDoublePrecision()) {
+            return read_only_view<double>(self, uvs.IsEmpty() ? nullptr : &uvs.Value<gp_Pnt2d>(0),
+                                          uvs.Size(), 2, uvs.Stride());
+        }
+        return read_only_view<float>(self, uvs.IsEmpty() ? nullptr : &uvs.Value<gp_Vec2f>(0),
+                                     uvs.Size(), 2, uvs.Stride());
+    }, py::is_method(cls), py::name("UVNodesArray"), "Returns a read-only (NbNodes, 2) view of the UV nodes, or None"));
+    py::setattr(cls, "NormalsArray", py::cpp_function([](py::object self) -> py::object {
+        Poly_Triangulation &tri = self.cast<Poly_Triangulation &>();
+        if (!tri.HasNormals()) return py::none();
+        const NCollection_Array1<gp_Vec3f> &normals = tri.InternalNormals();
+        return read_only_view<float>(self, normals.IsEmpty() ? nullptr : &normals.First(), normals.Size(), 3,
+                                     sizeof(gp_Vec3f));
+    }, py::is_method(cls), py::name("NormalsArray"), "Returns a read-only (NbNodes, 3) view of the normals, or None"));
+    py::setattr(cls, "TrianglesArray", py::cpp_function([](py::object self, bool zeroBased) -> py::array {
+        Poly_Triangulation &tri = self.cast<Poly_Triangulation &>();
+        const Poly_Array1OfTriangle &triangles = tri.InternalTriangles();
+        py::array view = read_only_view<int32_t>(self, triangles.IsEmpty() ? nullptr : &triangles.First(),
+                                                 triangles.Size(), 3, sizeof(Poly_Triangle));
+        if (!zeroBased) return view;
+        py::array_t<int32_t> result(std::vector<py::ssize_t>{triangles.Size(), 3});
+        int32_t *out = result.mutable_data();
+        const int32_t *in = triangles.IsEmpty() ? nullptr : reinterpret_cast<const int32_t *>(&triangles.First());
+        for (py::ssize_t i = 0; i < 3 * static_cast<py::ssize_t>(triangles.Size()); i++) out[i] = in[i] - 1;
+        return result;
+    }, py::is_method(cls), py::name("TrianglesArray"), py::arg("zeroBased") = true,
+       "Returns the (NbTriangles, 3) node indices: a read-only view of the 1-based ones or a 0-based copy"));
+}
+]==])
+
+append_module_extension(BRepMesh register_BRepMesh_arrays [==[
+// ----- Batch triangulation export (see patch_OCP.cmake) -----
+#include <pybind11/numpy.h>
+#include <BRep_Tool.hxx>
+#include <GeomLib.hxx>
+#include <gp.hxx>
+#include <Geom_Surface.hxx>
+#include <Poly_Triangulation.hxx>
+#include <Precision.hxx>
+#include <TopExp_Explorer.hxx>
+#include <TopoDS.hxx>
+#include <TopoDS_Face.hxx>
+
+// Moves a flat vector into a (size / columns, columns) array without copying it
+template <typename T>
+static py::array_t<T> vector_to_array(std::vector<T> &&data, py::ssize_t columns) {
+    auto *owned = new std::vector<T>(std::move(data));
+    py::capsule free_when_done(owned, [](void *p) { delete static_cast<std::vector<T> *>(p); });
+    return py::array_t<T>({static_cast<py::ssize_t>(owned->size()) / columns, columns}, owned->data(), free_when_done);
+}
+
+// Sums the normals of the triangles around each node (unit ones, or weighted by their areas) and normalizes them
+static std::vector<gp_Dir> averaged_normals(const Poly_Triangulation &tri, bool weighted) {
+    std::vector<gp_XYZ> sums(tri.NbNodes(), gp_XYZ(0.0, 0.0, 0.0));
+    for (Standard_Integer i = 1; i <= tri.NbTriangles(); i++) {
+        Standard_Integer n[3];
+        tri.Triangle(i).Get(n[0], n[1], n[2]);
+        const gp_XYZ v1 = tri.Node(n[1]).XYZ() - tri.Node(n[0]).XYZ();
+        const gp_XYZ v2 = tri.Node(n[2]).XYZ() - tri.Node(n[1]).XYZ();
+        gp_XYZ normal = v1 ^ v2;
+        const Standard_Real modulus = normal.Modulus();
+        if (modulus < Precision::Confusion()) continue;
+        if (!weighted) normal /= modulus;
+        for (Standard_Integer node : n) sums[node - 1] += normal;
+    }
+    std::vector<gp_Dir> normals;
+    normals.reserve(sums.size());
+    for (const gp_XYZ &sum : sums) {
+        normals.push_back(sum.Modulus() > Precision::Confusion() ? gp_Dir(sum) : gp::DZ());
+    }
+    return normals;
+}
+
+// The normals of the nodes like BRepLib_ToolTriangulatedShape::ComputeNormals (from the surface at the UV nodes, or
+// else from the triangles), but without storing them in the triangulation: it is shared with other threads, which may
+// be reading it (e.g. through NodesArray) while the GIL is released.
+static std::vector<gp_Dir> node_normals(const TopoDS_Face &face, const Poly_Triangulation &tri) {
+    if (tri.HasNormals()) {
+        std::vector<gp_Dir> normals;
+        normals.reserve(tri.NbNodes());
+        for (Standard_Integer i = 1; i <= tri.NbNodes(); i++) normals.push_back(tri.Normal(i));
+        return normals;
+    }
+    const Handle(Geom_Surface) surface = BRep_Tool::Surface(TopoDS::Face(face.Located(TopLoc_Location())));
+    if (!tri.HasUVNodes() || surface.IsNull()) return averaged_normals(tri, true);
+    std::vector<gp_Dir> normals(tri.NbNodes());
+    std::vector<gp_Dir> fallback;
+    for (Standard_Integer i = 1; i <= tri.NbNodes(); i++) {
+        if (GeomLib::NormEstim(surface, tri.UVNode(i), Precision::Confusion(), normals[i - 1]) > 1) {
+            if (fallback.empty()) fallback = averaged_normals(tri, false); // Singular point of the surface
+            normals[i - 1] = fallback[i - 1];
+        }
+    }
+    return normals;
+}
+
+static py::tuple triangulation_arrays(const TopoDS_Shape &shape, bool withNormals) {
+    std::vector<double> vertices;
+    std::vector<int32_t> triangles;
+    std::vector<float> normals;
+    std::vector<int32_t> face_offsets{0};
+    {
+        py::gil_scoped_release release;
+        for (TopExp_Explorer exp(shape, TopAbs_FACE); exp.More(); exp.Next()) {
+            const TopoDS_Face &face = TopoDS::Face(exp.Current());
+            TopLoc_Location location;
+            const Handle(Poly_Triangulation) &tri = BRep_Tool::Triangulation(face, location);
+            if (!tri.IsNull()) {
+                const gp_Trsf &trsf = location.Transformation();
+                const bool reversed = face.Orientation() == TopAbs_REVERSED;
+                const int32_t first_vertex = static_cast<int32_t>(vertices.size() / 3);
+                for (Standard_Integer i = 1; i <= tri->NbNodes(); i++) {
+                    gp_Pnt node = tri->Node(i);
+                    if (!location.IsIdentity()) node.Transform(trsf);
+                    vertices.insert(vertices.end(), {node.X(), node.Y(), node.Z()});
+                }
+                if (withNormals) {
+                    for (gp_Dir normal : node_normals(face, *tri)) {
+                        if (!location.IsIdentity()) normal.Transform(trsf);
+                        if (reversed) normal.Reverse();
+                        normals.insert(normals.end(), {static_cast<float>(normal.X()), static_cast<float>(normal.Y()),
+                                                       static_cast<float>(normal.Z())});
+                    }
+                }
+                for (Standard_Integer i = 1; i <= tri->NbTriangles(); i++) {
+                    Standard_Integer n1, n2, n3;
+                    tri->Triangle(i).Get(n1, n2, n3);
+                    if (reversed) std::swap(n2, n3);
+                    triangles.insert(triangles.end(), {first_vertex + n1 - 1, first_vertex + n2 - 1, first_vertex + n3 - 1});
+                }
+            }
+            face_offsets.push_back(static_cast<int32_t>(triangles.size() / 3));
+        }
+    }
+    py::object normals_array = withNormals ? py::object(vector_to_array(std::move(normals), 3)) : py::object(py::none());
+    py::array_t<int32_t> offsets_array = vector_to_array(std::move(face_offsets), 1);
+    return py::make_tuple(vector_to_array(std::move(vertices), 3), vector_to_array(std::move(triangles), 3),
+                          normals_array, offsets_array.attr("reshape")(-1));
+}
+
+static void register_BRepMesh_arrays(py::module &main_module) {
+    py::module m = static_cast<py::module>(main_module.attr("BRepMesh"));
+    m.def("BRepMesh_TriangulationArrays", &triangulation_arrays, py::arg("shape"), py::arg("withNormals") = false,
+          R"#(Gathers the existing triangulations of all faces of a shape (mesh it first, e.g. with
+BRepMesh_IncrementalMesh) into (vertices, triangles, normals, face_offsets) arrays: located float64 (N, 3)
+vertices, 0-based int32 (M, 3) triangles oriented like their faces, float32 (N, 3) normals (or None) and the
+int32 (NbFaces + 1,) offsets of the triangles of each face (in TopExp_Explorer order).)#");
+}
+]==])
+
+# ----- In-memory I/O -----
+# Reading/writing through (Emscripten's in-memory) files duplicates big models in memory, so STEP and BRep data can
+# be read from any bytes-like object (without copies) and written to an OSD_MemoryBuffer (bytes-like, no copies).
+# Anything else that goes through OSD_FileSystem (e.g. GLB export with RWGltf_CafWriter) can use in-memory files at
+# OSD_MemoryFileSystem_Path(name), taking the result with OSD_MemoryFileSystem_Take(path).
+set(memory_io_hxx "${REAL_SOURCE_DIR}/OCP_MemoryIO.hxx")
+set(memory_io_content [==[
+// In-memory streams and files shared by several modules (see patch_OCP.cmake)
+#pragma once
+#include <pybind11/pybind11.h>
+#include <OSD_FileSystem.hxx>
+#include <cstring>
+#include <istream>
+#include <map>
+#include <memory>
+#include <ostream>
+#include <stdexcept>
+#include <string>
+
+// Bytes produced by in-memory writers, exposed to Python through the buffer protocol
+struct OCP_MemoryBuffer {
+    std::string Data;
+};
+
+inline pybind11::object OCP_ToMemoryBuffer(std::string &&data) {
+    return pybind11::cast(new OCP_MemoryBuffer{std::move(data)}, pybind11::return_value_policy::take_ownership);
+}
+
+// Reads (and seeks) over memory owned by someone else
+class OCP_MemoryInBuf : public std::streambuf {
+public:
+    OCP_MemoryInBuf(const char *data, size_t size) {
+        char *begin = const_cast<char *>(data);
+        setg(begin, begin, begin + size);
+    }
+
+protected:
+    pos_type seekoff(off_type off, std::ios_base::seekdir dir, std::ios_base::openmode which) override {
+        if (!(which & std::ios_base::in)) return pos_type(off_type(-1));
+        off_type base = dir == std::ios_base::beg ? 0 : dir == std::ios_base::cur ? gptr() - eback() : egptr() - eback();
+        return seekpos(pos_type(base + off), which);
+    }
+    pos_type seekpos(pos_type pos, std::ios_base::openmode which) override {
+        if (!(which & std::ios_base::in) || off_type(pos) < 0 || off_type(pos) > egptr() - eback()) return pos_type(off_type(-1));
+        setg(eback(), eback() + off_type(pos), egptr());
+        return pos;
+    }
+};
+
+// Writes (and seeks) into a growable string
+class OCP_MemoryOutBuf : public std::streambuf {
+public:
+    explicit OCP_MemoryOutBuf(std::shared_ptr<std::string> data) : myData(std::move(data)) {}
+
+protected:
+    int_type overflow(int_type c) override {
+        if (traits_type::eq_int_type(c, traits_type::eof())) return traits_type::not_eof(c);
+        char ch = traits_type::to_char_type(c);
+        xsputn(&ch, 1);
+        return c;
+    }
+    std::streamsize xsputn(const char *s, std::streamsize n) override {
+        if (myPos == myData->size()) myData->append(s, n);
+        else {
+            if (myPos + n > myData->size()) myData->resize(myPos + n);
+            std::memcpy(&(*myData)[myPos], s, n);
+        }
+        myPos += n;
+        return n;
+    }
+    pos_type seekoff(off_type off, std::ios_base::seekdir dir, std::ios_base::openmode which) override {
+        off_type base = dir == std::ios_base::beg ? 0 : dir == std::ios_base::cur ? off_type(myPos) : off_type(myData->size());
+        return seekpos(pos_type(base + off), which);
+    }
+    pos_type seekpos(pos_type pos, std::ios_base::openmode which) override {
+        if (!(which & std::ios_base::out) || off_type(pos) < 0) return pos_type(off_type(-1));
+        if (size_t(off_type(pos)) > myData->size()) myData->resize(size_t(off_type(pos)));
+        myPos = size_t(off_type(pos));
+        return pos;
+    }
+
+private:
+    std::shared_ptr<std::string> myData;
+    size_t myPos = 0;
+};
+
+class OCP_MemoryIStream : public std::istream {
+public:
+    // Keeps the buffer of the Python object alive and pinned while reading
+    explicit OCP_MemoryIStream(const pybind11::buffer &data) : std::istream(nullptr), myInfo(data.request()),
+          myBuf(static_cast<const char *>(myInfo.ptr), myInfo.size * myInfo.itemsize) {
+        if (myInfo.ndim > 1 || (myInfo.ndim == 1 && myInfo.strides[0] != myInfo.itemsize))
+            throw std::invalid_argument("A contiguous bytes-like object is required");
+        rdbuf(&myBuf);
+    }
+
+private:
+    pybind11::buffer_info myInfo;
+    OCP_MemoryInBuf myBuf;
+};
+
+class OCP_MemoryOStream : public std::ostream {
+public:
+    explicit OCP_MemoryOStream(std::shared_ptr<std::string> data) : std::ostream(nullptr), myBuf(std::move(data)) {
+        rdbuf(&myBuf);
+    }
+
+private:
+    OCP_MemoryOutBuf myBuf;
+};
+
+// Files under Prefix() live in memory, for APIs that only accept paths
+class OCP_MemoryFileSystem : public OSD_FileSystem {
+public:
+    static const char *Prefix() { return "/__ocp_memory__/"; }
+
+    static OCP_MemoryFileSystem &Instance() {
+        static Handle(OCP_MemoryFileSystem) instance = [] {
+            Handle(OCP_MemoryFileSystem) fs = new OCP_MemoryFileSystem();
+            OSD_FileSystem::AddDefaultProtocol(fs, true);
+            return fs;
+        }();
+        return *instance;
+    }
+
+    std::map<std::string, std::shared_ptr<std::string>> Files;
+
+    Standard_Boolean IsSupportedPath(const TCollection_AsciiString &theUrl) const override {
+        return std::strncmp(theUrl.ToCString(), Prefix(), std::strlen(Prefix())) == 0;
+    }
+    Standard_Boolean IsOpenIStream(const std::shared_ptr<std::istream> &theStream) const override {
+        return theStream.get() != nullptr;
+    }
+    Standard_Boolean IsOpenOStream(const std::shared_ptr<std::ostream> &theStream) const override {
+        return theStream.get() != nullptr;
+    }
+    std::shared_ptr<std::streambuf> OpenStreamBuffer(const TCollection_AsciiString &theUrl,
+                                                     const std::ios_base::openmode theMode,
+                                                     const int64_t theOffset = 0,
+                                                     int64_t *theOutBufferSize = NULL) override {
+        const std::string path(theUrl.ToCString());
+        if (theMode & std::ios_base::out) {
+            std::shared_ptr<std::string> &data = Files[path];
+            if (!data || !(theMode & std::ios_base::app)) data = std::make_shared<std::string>();
+            auto buf = std::make_shared<OCP_MemoryOutBuf>(data);
+            buf->pubseekoff(0, std::ios_base::end, std::ios_base::out);
+            return buf;
+        }
+        auto it = Files.find(path);
+        if (it == Files.end() || theOffset < 0 || size_t(theOffset) > it->second->size()) return nullptr;
+        if (theOutBufferSize != NULL) *theOutBufferSize = int64_t(it->second->size()) - theOffset;
+        // Readers do not outlive the file contents, which are only released by Take/Remove
+        return std::make_shared<OCP_MemoryInBuf>(it->second->data() + theOffset, it->second->size() - size_t(theOffset));
+    }
+};
+]==])
+set(memory_io_old "")
+if(EXISTS "${memory_io_hxx}")
+  file(READ "${memory_io_hxx}" memory_io_old)
+endif()
+if(NOT memory_io_old STREQUAL memory_io_content)
+  file(WRITE "${memory_io_hxx}" "${memory_io_content}")
+  message(STATUS "Wrote OCP_MemoryIO.hxx")
+endif()
+
+append_module_extension(OSD register_OSD_memory_io [==[
+// ----- In-memory I/O (see patch_OCP.cmake) -----
+#include <OSD_FileSystem.hxx>
+#include "OCP_MemoryIO.hxx"
+
+static void register_OSD_memory_io(py::module &main_module) {
+    py::module m = static_cast<py::module>(main_module.attr("OSD"));
+    py::class_<OCP_MemoryBuffer>(m, "OSD_MemoryBuffer", py::buffer_protocol(),
+                                 "Read-only bytes-like result of in-memory writers (see bytes(), memoryview())")
+        .def_buffer([](OCP_MemoryBuffer &self) {
+            return py::buffer_info(&self.Data[0], 1, py::format_descriptor<uint8_t>::format(), 1,
+                                   {static_cast<py::ssize_t>(self.Data.size())}, {1}, true);
+        })
+        .def("__len__", [](const OCP_MemoryBuffer &self) { return self.Data.size(); });
+    m.def("OSD_MemoryFileSystem_Path", [](const std::string &name) {
+        OCP_MemoryFileSystem::Instance();
+        return std::string(OCP_MemoryFileSystem::Prefix()) + name;
+    }, py::arg("name"), "Returns the path of an in-memory file, usable with any API that goes through OSD_FileSystem");
+    m.def("OSD_MemoryFileSystem_Put", [](const std::string &path, py::buffer data) {
+        py::buffer_info info = data.request();
+        OCP_MemoryFileSystem::Instance().Files[path] =
+            std::make_shared<std::string>(static_cast<const char *>(info.ptr), info.size * info.itemsize);
+    }, py::arg("path"), py::arg("data"), "Creates (or replaces) an in-memory file with a copy of the given bytes");
+    m.def("OSD_MemoryFileSystem_Take", [](const std::string &path) {
+        auto &files = OCP_MemoryFileSystem::Instance().Files;
+        auto it = files.find(path);
+        if (it == files.end()) throw py::key_error(path);
+        std::shared_ptr<std::string> data = it->second;
+        files.erase(it);
+        return OCP_ToMemoryBuffer(std::move(*data));
+    }, py::arg("path"), "Removes an in-memory file, returning its contents as an OSD_MemoryBuffer");
+}
+]==])
+
+append_module_extension(BRepTools register_BRepTools_memory_io [==[
+// ----- In-memory I/O (see patch_OCP.cmake) -----
+#include <BRep_Builder.hxx>
+#include <BRepTools.hxx>
+#include <OSD_FileSystem.hxx>
+#include <TopTools_FormatVersion.hxx>
+#include <TopoDS_Shape.hxx>
+#include "OCP_MemoryIO.hxx"
+
+static void register_BRepTools_memory_io(py::module &main_module) {
+    py::module m = static_cast<py::module>(main_module.attr("BRepTools"));
+    m.def("BRepTools_ReadBytes", [](py::buffer data) {
+        OCP_MemoryIStream stream(data);
+        TopoDS_Shape shape;
+        {
+            py::gil_scoped_release release;
+            BRepTools::Read(shape, stream, BRep_Builder());
+        }
+        if (shape.IsNull()) throw std::runtime_error("Could not read a BRep shape from the given data");
+        return shape;
+    }, py::arg("data"), "Reads a BRep shape from any bytes-like object, without copying it");
+    m.def("BRepTools_WriteBytes", [](const TopoDS_Shape &shape, bool withTriangles, bool withNormals) {
+        auto data = std::make_shared<std::string>();
+        {
+            OCP_MemoryOStream stream(data);
+            py::gil_scoped_release release;
+            BRepTools::Write(shape, stream, withTriangles, withNormals, TopTools_FormatVersion_CURRENT);
+        }
+        return OCP_ToMemoryBuffer(std::move(*data));
+    }, py::arg("shape"), py::arg("withTriangles") = true, py::arg("withNormals") = false,
+       "Writes a shape in BRep format to a new OSD_MemoryBuffer");
+}
+]==])
+
+set(step_memory_io_template [==[
+// ----- In-memory I/O (see patch_OCP.cmake) -----
+#include <IFSelect_ReturnStatus.hxx>
+#include <OSD_FileSystem.hxx>
+#include <@STEP_MODULE@_Reader.hxx>
+#include <@STEP_MODULE@_Writer.hxx>
+#include "OCP_MemoryIO.hxx"
+
+static void register_@STEP_MODULE@_memory_io(py::module &main_module) {
+    py::module m = static_cast<py::module>(main_module.attr("@STEP_MODULE@"));
+    py::object reader = m.attr("@STEP_MODULE@_Reader");
+    py::setattr(reader, "ReadBytes", py::cpp_function([](@STEP_MODULE@_Reader &self, py::buffer data, const std::string &name) {
+        OCP_MemoryIStream stream(data);
+        py::gil_scoped_release release;
+        return self.ReadStream(name.c_str(), stream);
+    }, py::is_method(reader), py::name("ReadBytes"), py::arg("data"), py::arg("name") = "memory.step",
+       "Like ReadFile, but reads the STEP data from any bytes-like object, without copying it"));
+    py::object writer = m.attr("@STEP_MODULE@_Writer");
+    py::setattr(writer, "WriteBytes", py::cpp_function([](@STEP_MODULE@_Writer &self) {
+        auto data = std::make_shared<std::string>();
+        IFSelect_ReturnStatus status;
+        {
+            OCP_MemoryOStream stream(data);
+            py::gil_scoped_release release;
+            status = self.WriteStream(stream);
+        }
+        if (status != IFSelect_RetDone)
+            throw std::runtime_error("Could not write STEP data (IFSelect_ReturnStatus " + std::to_string(status) + ")");
+        return OCP_ToMemoryBuffer(std::move(*data));
+    }, py::is_method(writer), py::name("WriteBytes"),
+       "Like Write, but returns the STEP data as a new OSD_MemoryBuffer"));
+}
+]==])
+foreach(STEP_MODULE STEPControl STEPCAFControl)
+  string(CONFIGURE "${step_memory_io_template}" step_memory_io @ONLY)
+  append_module_extension(${STEP_MODULE} register_${STEP_MODULE}_memory_io "${step_memory_io}")
+endforeach()
+
+# ----- Heap statistics -----
+# Long-lived sessions fragment the (wasm) heap, so Standard_HeapStatistics() reports what malloc holds (see README.md).
+append_module_extension(Standard register_Standard_heap_statistics [==[
+// ----- Heap statistics (see patch_OCP.cmake) -----
+#include <Standard.hxx>
+#if defined(__EMSCRIPTEN__)
+#include <emscripten/heap.h>
+#include <malloc.h>
+#define OCP_MALLINFO mallinfo
+#elif defined(__GLIBC__)
+#include <malloc.h>
+#if __GLIBC_PREREQ(2, 33)
+#define OCP_MALLINFO mallinfo2
+#endif
+#endif
+
+static void register_Standard_heap_statistics(py::module &main_module) {
+    py::module m = static_cast<py::module>(main_module.attr("Standard"));
+    m.def("Standard_HeapStatistics", [](bool purge) {
+        static const char *allocators[] = {"NATIVE", "OPT", "TBB", "JEMALLOC"};
+        py::dict stats;
+        stats["allocator"] = allocators[static_cast<int>(Standard::GetAllocatorType())];
+        stats["purged"] = purge ? Standard::Purge() : 0;
+#ifdef OCP_MALLINFO
+        auto info = OCP_MALLINFO();
+        size_t free = info.fordblks, releasable = info.keepcost;
+        stats["in_use"] = static_cast<size_t>(info.uordblks);
+        stats["free"] = free;
+        stats["releasable"] = releasable;
+        // Free memory that can't be given back (or reused for big blocks) because it is not at the top of the heap
+        stats["fragmentation"] = free ? static_cast<double>(free - releasable) / free : 0.0;
+#ifdef __EMSCRIPTEN__
+        stats["heap_size"] = emscripten_get_heap_size();
+        stats["heap_max"] = emscripten_get_heap_max();
+        stats["peak"] = static_cast<size_t>(info.usmblks);
+#else
+        stats["heap_size"] = static_cast<size_t>(info.arena + info.hblkhd);
+        stats["heap_max"] = py::none();
+        stats["peak"] = py::none();
+#endif
+#else
+        throw std::runtime_error("Heap statistics are not available on this platform");
+#endif
+        return stats;
+    }, py::arg("purge") = false,
+       "Returns a dict with the OCCT allocator, the heap size (and maximum and peak, in bytes), the bytes in use, free "
+       "and releasable by malloc, and the fragmentation of the free bytes (0 to 1). Purge releases OCCT's pools first.");
+}
+]==])
+
+# ----- Lazy submodule registration in OCP.cpp -----
+# Natively, registering all (thousands of) classes of every module takes almost all the time and memory of import OCP.
+# Instead, each module is registered (along with all the modules its classes refer to) the first time it is accessed
+# as an attribute (OCP.gp) or imported (import OCP.gp). Set OCP_EAGER_MODULES=1 at runtime to register all of them.
+# XXX: The effect on the wasm build is not measured yet: compare the import-lazy/eager-*.json CI artifacts.
+if(OCP_LAZY_MODULES)
+  file(READ "${ocp_cpp}" content)
+  set(content_old "${content}")
+  string(FIND "${content}" "namespace ocp_lazy" _already_lazy)
+  string(REGEX MATCHALL "\n[ \t]*register_[A-Za-z0-9]+_enums\\(m\\)" enum_calls "${content}")
+  string(REGEX MATCH "PYBIND11_MODULE\\(OCP, m\\)[ \t\r\n]*{" module_start "${content}")
+  if(_already_lazy EQUAL -1 AND (NOT enum_calls OR NOT module_start))
+    message(WARNING "Unexpected OCP.cpp structure, keeping eager registration of all modules")
+  elseif(_already_lazy EQUAL -1)
+    set(lazy_modules "")
+    set(index 0)
+    foreach(call IN LISTS enum_calls)
+      string(REGEX REPLACE "\n[ \t]*register_([A-Za-z0-9]+)_enums\\(m\\)" "\\1" module "${call}")
+      list(APPEND lazy_modules "${module}")
+      set(index_of_${module} ${index})
+      math(EXPR index "${index} + 1")
+    endforeach()
+
+    # The dependencies of a module are the modules owning any type named in its includes, class declarations and
+    # function definitions (e.g. gp_Pnt -> gp, Precision::Confusion() -> Precision), which covers base classes,
+    # arguments, results and default values (py::arg("x") = gp_Pnt() is converted to Python when it is registered).
+    set(LAZY_TABLE "")
+    foreach(module IN LISTS lazy_modules)
+      set(deps "")
+      set(module_lines "")
+      set(found_sources FALSE)
+      foreach(src "${REAL_SOURCE_DIR}/${module}.cpp" "${REAL_SOURCE_DIR}/${module}_pre.cpp")
+        if(EXISTS "${src}")
+          file(STRINGS "${src}" lines REGEX "^#include <|py::class_<|\\.def|py::arg|py::init|static_cast<")
+          string(APPEND module_lines "${lines}")
+          set(found_sources TRUE)
+        endif()
+      endforeach()
+      if(found_sources)
+        string(REGEX MATCHALL "[A-Za-z][A-Za-z0-9]*(_|::)" prefixes "${module_lines}")
+        list(REMOVE_DUPLICATES prefixes)
+        foreach(prefix IN LISTS prefixes)
+          string(REGEX REPLACE "(_|::)$" "" dep "${prefix}")
+          if(DEFINED index_of_${dep} AND NOT dep STREQUAL module)
+            list(APPEND deps ${index_of_${dep}})
+          endif()
+        endforeach()
+      elseif(index_of_${module} GREATER 0) # Unknown dependencies: conservatively depend on all previous modules
+        math(EXPR last_index "${index_of_${module}} - 1")
+        foreach(dep RANGE ${last_index})
+          list(APPEND deps ${dep})
+        endforeach()
+      endif()
+      list(SORT deps COMPARE NATURAL)
+      string(REPLACE ";" ", " deps "${deps}")
+      string(APPEND LAZY_TABLE "    {\"${module}\", register_${module}_enums, register_${module}, {${deps}}, false, false},\n")
+    endforeach()
+
+    set(LAZY_HOOKS [==[
+import sys
+import importlib.abc
+import importlib.util
+
+_names = frozenset(_names)
+
+
+def __getattr__(name):
+    if name in _names:
+        return _ocp._load_module(name)
+    raise AttributeError(f"module 'OCP' has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(_ocp.__dict__) | _names)
+
+
+class _LazySubmoduleFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname.startswith("OCP.") and fullname[4:] in _names:
+            return importlib.util.spec_from_loader(fullname, self)
+        return None
+
+    def create_module(self, spec):
+        return _ocp._load_module(spec.name[4:])
+
+    def exec_module(self, module):
+        pass
+
+
+sys.meta_path.insert(0, _LazySubmoduleFinder())
+]==])
+    string(CONFIGURE [==[
+// ----- Lazy module registration (see patch_OCP.cmake) -----
+#include <pybind11/eval.h>
+#include <cstdlib>
+#include <string>
+#include <vector>
+
+namespace ocp_lazy {
+
+struct Module {
+    const char *name;
+    void (*register_enums)(py::module &);
+    void (*register_module)(py::module &);
+    std::vector<size_t> deps;
+    bool enums_registered;
+    bool registered;
+};
+
+// In the original registration order, which is kept for any subset as it already respects all dependencies
+static std::vector<Module> modules = {
+@LAZY_TABLE@};
+
+static py::module *root = nullptr;
+
+static void collect(size_t index, std::vector<bool> &needed) {
+    if (needed[index]) return;
+    needed[index] = true;
+    for (size_t dep : modules[index].deps) collect(dep, needed);
+}
+
+static void ensure_registered(size_t index) {
+    if (modules[index].registered) return;
+    std::vector<bool> needed(modules.size(), false);
+    collect(index, needed);
+    for (size_t i = 0; i < modules.size(); i++) {
+        if (needed[i] && !modules[i].enums_registered) {
+            modules[i].enums_registered = true;
+            modules[i].register_enums(*root);
+        }
+    }
+    py::object sys_modules = py::module::import("sys").attr("modules");
+    for (size_t i = 0; i < modules.size(); i++) {
+        if (needed[i] && !modules[i].registered) {
+            modules[i].registered = true;
+            modules[i].register_module(*root);
+            sys_modules[py::str(std::string("OCP.") + modules[i].name)] = root->attr(modules[i].name);
+        }
+    }
+}
+
+static py::object load_module(const std::string &name) {
+    for (size_t i = 0; i < modules.size(); i++) {
+        if (name == modules[i].name) {
+            ensure_registered(i);
+            return root->attr(modules[i].name);
+        }
+    }
+    throw py::attribute_error("module 'OCP' has no attribute '" + name + "'");
+}
+
+static void init(py::module &m) {
+    root = new py::module(m); // Never freed: the module lives until the interpreter exits
+    py::list names;
+    for (auto &module : modules) names.append(module.name);
+    m.def("_load_module", &load_module, "Registers an OCP submodule and its dependencies (if needed) and returns it");
+    m.def("_load_all_modules", []() { for (size_t i = 0; i < modules.size(); i++) ensure_registered(i); },
+          "Registers all OCP submodules, as done before lazy registration");
+    m.attr("__path__") = py::list(); // Makes `import OCP.<module>` reach the lazy finder below
+    py::dict scope;
+    scope["_ocp"] = m;
+    scope["_names"] = names;
+    py::exec(R"py(@LAZY_HOOKS@)py", scope);
+    m.attr("__getattr__") = scope["__getattr__"];
+    m.attr("__dir__") = scope["__dir__"];
+    const char *eager = std::getenv("OCP_EAGER_MODULES");
+    if (eager != nullptr && std::string(eager) != "" && std::string(eager) != "0") {
+        for (size_t i = 0; i < modules.size(); i++) ensure_registered(i);
+    }
+}
+
+} // namespace ocp_lazy
+
+]==] lazy_code @ONLY)
+    string(REGEX REPLACE "(\n[ \t]*)(register_[A-Za-z0-9]+(_enums)?\\(m\\);)" "\\1/*\\2*/" content "${content}")
+    string(REPLACE "${module_start}" "${lazy_code}${module_start}\n    ocp_lazy::init(m);" content "${content}")
+    list(LENGTH lazy_modules lazy_modules_count)
+    message(STATUS "Made the registration of ${lazy_modules_count} OCP modules lazy")
+  endif()
+  if(NOT content STREQUAL content_old)
+    file(WRITE "${ocp_cpp}" "${content}")
+    message(STATUS "Patched OCP.cpp (lazy modules)")
+  endif()
+endif()
+
 # ----- Modify OSD.cpp -----
 # Do not expose OSD_OpenFile as FILE* is not safely bindable in Emscripten (or even desktop platforms in many cases) via pybind11 because of the incomplete _IO_FILE type and RTTI (typeid) issues.
 set(osd_cpp "${REAL_SOURCE_DIR}/OSD.cpp")
@@ -57,10 +850,19 @@ if(NOT content STREQUAL content_old)
 endif()
 
 # ----- Patch CMakeLists.txt -----
+# Also starts from the original, as the OCCT paths change between built and prebuilt OCCTs (see CMakeLists.txt)
 message(STATUS "OpenCASCADE_LIBRARIES=${OpenCASCADE_LIBRARIES}")
 set(OCP_CMAKE "${REAL_SOURCE_DIR}/CMakeLists.txt")
-file(READ "${OCP_CMAKE}" content)
-set(content_old "${content}")
+file(READ "${OCP_CMAKE}" content_old)
+if(EXISTS "${OCP_CMAKE}.orig")
+  file(READ "${OCP_CMAKE}.orig" content)
+else()
+  if(content_old MATCHES "#\\[\\[[ \t]*find_package")
+    message(FATAL_ERROR "${OCP_CMAKE} was patched by an older version of this script, remove the OCP sources to refetch them")
+  endif()
+  file(COPY_FILE "${OCP_CMAKE}" "${OCP_CMAKE}.orig")
+  set(content "${content_old}")
+endif()
 string(REGEX REPLACE "\n([ \t]*find_package[ \t]*\\([^)]*(VTK|Python)[^)]*\\))" "\n#[[ \\1 ]]" content "${content}")
 string(REGEX REPLACE "([ \t]+)(VTK::[^ )]*)" "\\1#[[\\2]]" content "${content}")
 string(REGEX REPLACE "([ \t]+)(INTERPROCEDURAL_OPTIMIZATION[ \t]+FALSE)" "\\1#[[\\2]]" content "${content}")
@@ -4,11 +4,31 @@ import os
 import os.path
 import shutil
 import re
+import hashlib
+import bisect
+import json
+import zlib
+import argparse
+from collections import defaultdict
+
+def _env_flag(name):
+    return os.environ.get(name, "").lower() in {"1", "on", "true", "yes"}
+
+
+def wasm_feature_args():
+    """Features used by the module that wasm-opt must be told about (WASM_SIMD is set for -msimd128 builds and
+    WASM_THREADS for -pthread builds, which use atomics, a shared memory and passive data segments)."""
+    args = ['--enable-exception-handling']
+    if _env_flag("WASM_SIMD"):
+        args.append('--enable-simd')
+    if _env_flag("WASM_THREADS"):
+        args += ['--enable-threads', '--enable-bulk-memory']
+    return args
 
 def get_error_offset(wasm_file):
     try:
         subprocess.run(
-            ['wasm-opt', '--no-validation', '--enable-exception-handling', '-O0', wasm_file, '-o', os.devnull],
+            ['wasm-opt', '--no-validation'] + wasm_feature_args() + ['-O0', wasm_file, '-o', os.devnull],
             stderr=subprocess.PIPE,
             stdout=subprocess.DEVNULL,
             check=True
@@ -23,6 +43,19 @@ def get_error_offset(wasm_file):
                 return int(all_non_zero_integers[0])
         raise RuntimeError(f"Could not parse offset from wasm-opt stderr:\n{stderr}")
 
+def validate_wasm(wasm_file):
+    """Fails if the module is invalid (e.g. after a bad repair), as the optimization skips validation to save time.
+
+    Opt-in (WASM_VALIDATE=1) to debug the repair: it is a second full pass of wasm-opt, and the validator may reject
+    modules for reasons unrelated to br_tables."""
+    result = subprocess.run(
+        ['wasm-opt'] + wasm_feature_args() + [wasm_file, '-o', os.devnull],
+        stderr=subprocess.PIPE,
+        stdout=subprocess.DEVNULL
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"The repaired module {wasm_file} is not valid:\n{result.stderr.decode()}")
+
 def patch_wasm(wasm_bytes, error_offset):
     start = error_offset
     while start >= 0 and wasm_bytes[start] != 0x0E:
@@ -34,15 +67,300 @@ def patch_wasm(wasm_bytes, error_offset):
         raise RuntimeError(f"Found br_table (0x0E) instruction is probably too long (maybe wasm is invalid for a different reason?).")
     for i in range(start, error_offset + 1):
         wasm_bytes[i] = 0x00  # Replace with 'unreachable'
-    return wasm_bytes
+    return wasm_bytes, start
 
-def repair_and_optimize_wasm(input_path, output_path):
-    print(f"Copying and repairing: {input_path}")
-    with open(input_path, 'rb') as f:
-        wasm_bytes = bytearray(f.read())
+# ----- Single-pass repair -----
+# Instead of asking wasm-opt for the next error offset over and over (a full parse of the huge module per invalid
+# instruction), decode every function body once and collect all the br_table instructions that jump to labels
+# outside of their enclosing blocks. Bodies are independent, so they are decoded in parallel by chunks.
+
+_BLOCK, _END, _DELEGATE, _BR_TABLE, _LEB, _LEB2, _MEMARG, _BYTES4, _BYTES8, _SELECT_T, _TRY_TABLE, \
+    _PREFIX_FC, _PREFIX_FD, _PREFIX_FE, _NONE = range(15)
+
+_OPCODES = [None] * 256
+for _op in (0x00, 0x01, 0x05, 0x0A, 0x0F, 0x19, 0x1A, 0x1B, 0xD1, 0xD3, 0xD4, *range(0x45, 0xC5)):
+    _OPCODES[_op] = _NONE
+for _op in (0x07, 0x08, 0x09, 0x0C, 0x0D, 0x10, 0x12, 0x14, 0x15, 0x3F, 0x40, 0x41, 0x42, 0xD0, 0xD2, 0xD5, 0xD6,
+            *range(0x20, 0x27)):
+    _OPCODES[_op] = _LEB
+for _op in (0x02, 0x03, 0x04, 0x06):
+    _OPCODES[_op] = _BLOCK
+for _op in range(0x28, 0x3F):
+    _OPCODES[_op] = _MEMARG
+_OPCODES[0x0B] = _END
+_OPCODES[0x0E] = _BR_TABLE
+_OPCODES[0x11] = _LEB2
+_OPCODES[0x13] = _LEB2
+_OPCODES[0x18] = _DELEGATE
+_OPCODES[0x1C] = _SELECT_T
+_OPCODES[0x1F] = _TRY_TABLE
+_OPCODES[0x43] = _BYTES4
+_OPCODES[0x44] = _BYTES8
+_OPCODES[0xFC] = _PREFIX_FC
+_OPCODES[0xFD] = _PREFIX_FD
+_OPCODES[0xFE] = _PREFIX_FE
+
+# Number of LEB immediates of each 0xFC (saturating truncation, bulk memory and table) instruction
+_FC_LEBS = [0] * 8 + [2, 1, 2, 1, 2, 1, 2, 1, 1, 1]
+
+
+def read_leb(buf, pos):
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte & 0x80 == 0:
+            return result, pos
+        shift += 7
+
+
+def _skip_leb(buf, pos):
+    while buf[pos] & 0x80:
+        pos += 1
+    return pos + 1
+
+
+def _skip_memarg(buf, pos):
+    align, pos = read_leb(buf, pos)
+    if align & 0x40:  # Multi-memory: explicit memory index
+        pos = _skip_leb(buf, pos)
+    return _skip_leb(buf, pos)
+
+
+def _skip_valtype(buf, pos):
+    if buf[pos] in (0x63, 0x64):  # (ref null? <heaptype>)
+        return _skip_leb(buf, pos + 1)
+    return _skip_leb(buf, pos)  # Single-byte value types, empty block type (0x40) or type index
+
+
+def read_name(buf, pos):
+    length, pos = read_leb(buf, pos)
+    return bytes(buf[pos:pos + length]).decode("utf-8", errors="replace"), pos + length
+
+
+def iter_sections(buf):
+    if bytes(buf[:4]) != b"\0asm":
+        raise RuntimeError("Not a WebAssembly module (bad magic number).")
+    pos = 8
+    while pos < len(buf):
+        section_id = buf[pos]
+        size, pos = read_leb(buf, pos + 1)
+        yield section_id, pos, pos + size
+        pos += size
+
+
+def _count_imported_functions(buf, pos):
+    count, pos = read_leb(buf, pos)
+    functions = 0
+    for _ in range(count):
+        _, pos = read_name(buf, pos)
+        _, pos = read_name(buf, pos)
+        kind = buf[pos]
+        pos += 1
+        if kind == 0x00:  # Function
+            functions += 1
+            pos = _skip_leb(buf, pos)
+        elif kind == 0x01:  # Table
+            pos = _skip_valtype(buf, pos)
+            flags, pos = read_leb(buf, pos)
+            pos = _skip_leb(buf, pos)
+            if flags & 0x01:
+                pos = _skip_leb(buf, pos)
+        elif kind == 0x02:  # Memory
+            flags, pos = read_leb(buf, pos)
+            pos = _skip_leb(buf, pos)
+            if flags & 0x01:
+                pos = _skip_leb(buf, pos)
+        elif kind == 0x03:  # Global
+            pos = _skip_valtype(buf, pos) + 1
+        elif kind == 0x04:  # Tag
+            pos = _skip_leb(buf, pos + 1)
+        else:
+            raise RuntimeError(f"Unknown import kind {kind} at offset {pos - 1}.")
+    return functions
+
+
+def _read_function_names(buf, pos, end):
+    names = {}
+    while pos < end:
+        subsection_id = buf[pos]
+        size, pos = read_leb(buf, pos + 1)
+        if subsection_id == 1:  # Function names
+            count, sub_pos = read_leb(buf, pos)
+            for _ in range(count):
+                index, sub_pos = read_leb(buf, sub_pos)
+                names[index], sub_pos = read_name(buf, sub_pos)
+        pos += size
+    return names
 
-    fixed_path = input_path + '.fixed.wasm'
 
+def read_module_layout(buf):
+    """Returns the function bodies as (function index, start, end) tuples and the function names (if available)."""
+    imported_functions = 0
+    bodies = []
+    names = {}
+    for section_id, start, end in iter_sections(buf):
+        if section_id == 2:  # Import
+            imported_functions = _count_imported_functions(buf, start)
+        elif section_id == 10:  # Code
+            count, pos = read_leb(buf, start)
+            for i in range(count):
+                size, pos = read_leb(buf, pos)
+                bodies.append((imported_functions + i, pos, pos + size))
+                pos += size
+        elif section_id == 0:
+            section_name, pos = read_name(buf, start)
+            if section_name == "name":
+                names = _read_function_names(buf, pos, end)
+    return bodies, names
+
+
+def find_invalid_br_tables_in_body(buf, pos, end):
+    """Decodes one function body and returns the [start, end) byte ranges of br_table instructions with labels
+    that do not refer to any enclosing block."""
+    local_groups, pos = read_leb(buf, pos)
+    for _ in range(local_groups):
+        pos = _skip_valtype(buf, _skip_leb(buf, pos))
+
+    opcodes = _OPCODES
+    invalid = []
+    depth = 1  # The function body itself is the outermost block
+    while depth > 0:
+        if pos >= end:
+            raise RuntimeError(f"Function body ends at offset {end} before its final end instruction.")
+        start = pos
+        op = buf[pos]
+        pos += 1
+        kind = opcodes[op]
+        if kind == _NONE:
+            pass
+        elif kind == _LEB:
+            pos = _skip_leb(buf, pos)
+        elif kind == _MEMARG:
+            pos = _skip_memarg(buf, pos)
+        elif kind == _BLOCK:
+            pos = _skip_valtype(buf, pos)
+            depth += 1
+        elif kind == _END:
+            depth -= 1
+        elif kind == _BR_TABLE:
+            count, pos = read_leb(buf, pos)
+            is_valid = True
+            for _ in range(count + 1):  # All targets plus the default one
+                label, pos = read_leb(buf, pos)
+                if label >= depth:
+                    is_valid = False
+            if not is_valid:
+                invalid.append((start, pos))
+        elif kind == _LEB2:
+            pos = _skip_leb(buf, _skip_leb(buf, pos))
+        elif kind == _BYTES4:
+            pos += 4
+        elif kind == _BYTES8:
+            pos += 8
+        elif kind == _DELEGATE:
+            pos = _skip_leb(buf, pos)
+            depth -= 1
+        elif kind == _SELECT_T:
+            count, pos = read_leb(buf, pos)
+            for _ in range(count):
+                pos = _skip_valtype(buf, pos)
+        elif kind == _TRY_TABLE:
+            pos = _skip_valtype(buf, pos)
+            count, pos = read_leb(buf, pos)
+            for _ in range(count):
+                catch_kind = buf[pos]
+                pos += 1
+                if catch_kind in (0x00, 0x01):  # catch / catch_ref have a tag index before the label
+                    pos = _skip_leb(buf, pos)
+                pos = _skip_leb(buf, pos)
+            depth += 1
+        elif kind == _PREFIX_FC:
+            sub_op, pos = read_leb(buf, pos)
+            if sub_op >= len(_FC_LEBS):
+                raise RuntimeError(f"Unsupported instruction 0xFC {sub_op} at offset {start}.")
+            for _ in range(_FC_LEBS[sub_op]):
+                pos = _skip_leb(buf, pos)
+        elif kind == _PREFIX_FD:
+            sub_op, pos = read_leb(buf, pos)
+            if sub_op <= 11 or sub_op in (92, 93):  # Loads and stores
+                pos = _skip_memarg(buf, pos)
+            elif sub_op in (12, 13):  # v128.const and i8x16.shuffle
+                pos += 16
+            elif 21 <= sub_op <= 34:  # Lane accesses
+                pos += 1
+            elif 84 <= sub_op <= 91:  # Lane loads and stores
+                pos = _skip_memarg(buf, pos) + 1
+        elif kind == _PREFIX_FE:
+            sub_op, pos = read_leb(buf, pos)
+            pos = pos + 1 if sub_op == 0x03 else _skip_memarg(buf, pos)  # atomic.fence has a single reserved byte
+        else:
+            raise RuntimeError(f"Unsupported opcode 0x{op:02X} at offset {start}.")
+    if pos != end:
+        raise RuntimeError(f"Function body ends at offset {pos}, expected {end}.")
+    return invalid
+
+
+def _find_invalid_br_tables_in_chunk(wasm_path, chunk_start, chunk_end, bodies):
+    with open(wasm_path, 'rb') as f:
+        f.seek(chunk_start)
+        buf = f.read(chunk_end - chunk_start)
+    sites = []
+    for function_index, start, end in bodies:
+        for site_start, site_end in find_invalid_br_tables_in_body(buf, start - chunk_start, end - chunk_start):
+            sites.append((function_index, chunk_start + site_start, chunk_start + site_end))
+    return sites
+
+
+def find_invalid_br_tables(wasm_path, wasm_bytes, jobs=None):
+    """Decodes the whole code section once (in parallel) and returns all invalid br_table sites, sorted by offset,
+    as dictionaries with the function index, function name (if known) and the [start, end) byte range."""
+    bodies, names = read_module_layout(wasm_bytes)
+    jobs = jobs or os.cpu_count() or 1
+    chunk_size = max(1, sum(end - start for _, start, end in bodies) // (jobs * 8))
+    chunks = []
+    for body in bodies:
+        if not chunks or chunks[-1][-1][2] - chunks[-1][0][1] >= chunk_size:
+            chunks.append([])
+        chunks[-1].append(body)
+
+    print(f"Decoding {len(bodies)} function bodies in {len(chunks)} chunks using {jobs} processes...")
+    if jobs == 1 or len(chunks) <= 1:
+        results = [_find_invalid_br_tables_in_chunk(wasm_path, c[0][1], c[-1][2], c) for c in chunks]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(_find_invalid_br_tables_in_chunk, wasm_path, c[0][1], c[-1][2], c)
+                       for c in chunks]
+            results = [future.result() for future in futures]
+
+    return [{"function": function_index, "name": names.get(function_index), "start": start, "end": end}
+            for result in results for function_index, start, end in result]
+
+
+def repair_wasm_single_pass(wasm_path, wasm_bytes):
+    sites = find_invalid_br_tables(wasm_path, wasm_bytes)
+    for site in sites:
+        if site["end"] - site["start"] > 30:
+            raise RuntimeError(f"Found br_table (0x0E) instruction is probably too long (maybe wasm is invalid for a different reason?).")
+        # Replace the whole instruction with 'unreachable' opcodes, which keeps all offsets and sizes unchanged
+        wasm_bytes[site["start"]:site["end"]] = b"\x00" * (site["end"] - site["start"])
+
+    functions = defaultdict(list)
+    for site in sites:
+        functions[site["name"] or f"<function {site['function']}>"].append(f"[{site['start']}, {site['end']})")
+    print(f"Patched {len(sites)} invalid br_table site(s) in {len(functions)} function(s)")
+    for name, ranges in functions.items():
+        print(f"  {name}: {', '.join(ranges)}")
+    return sites
+
+
+# ----- Iterative repair (fallback) -----
+
+def repair_wasm_iteratively(wasm_bytes, fixed_path):
+    """Returns the repaired module and the patched sites (without their functions, see resolve_site_functions)."""
+    sites = []
     while True:
         with open(fixed_path, 'wb') as f:
             f.write(wasm_bytes)
@@ -52,34 +370,456 @@ def repair_and_optimize_wasm(input_path, output_path):
         if offset is None:
             break  # All errors fixed
 
-        wasm_bytes = patch_wasm(wasm_bytes, offset)
-        
+        wasm_bytes, start = patch_wasm(wasm_bytes, offset)
+        sites.append({"function": None, "name": None, "start": start, "end": offset + 1})
+    return wasm_bytes, sites
+
+
+# ----- Size report -----
+# What makes up the module, to catch download size regressions and decide what to prune: the size of each section,
+# the biggest functions and the code size of each OCCT toolkit and OCP module, the patched br_table sites and the
+# sizes before and after wasm-opt. Functions are attributed by their names (from the name section of the module or
+# of its .debug.wasm file) or else by their source files (from the source map). It is written as JSON to the path in
+# WASM_SIZE_REPORT, and two reports can be compared with `python repair_wasm.py --diff <old.json> <new.json>`.
+
+REPORT_TOP_FUNCTIONS = 200
+
+_SECTION_NAMES = ["custom", "type", "import", "function", "table", "memory", "global", "export", "start", "element",
+                  "code", "data", "datacount", "tag"]
+_IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+_MANGLED_LENGTH = re.compile(r'[0-9]+')
+_OCCT_CLASS = re.compile(r'([A-Za-z][A-Za-z0-9]*)_[A-Z]')  # gp_Pnt, BRepAlgoAPI_Cut, math_Matrix...
+_OCCT_SOURCE = re.compile(r'(?:^|/)([A-Za-z][A-Za-z0-9]*)/\1[._][^/]*$')  # .../src/gp/gp_Pnt.cxx
+_OCP_SOURCE = re.compile(r'(?:^|/)([A-Za-z][A-Za-z0-9]*)(?:_pre)?\.cpp$')  # .../gp.cpp or .../gp_pre.cpp
+
+
+def section_sizes(buf):
+    """The size of each section (custom sections by name, e.g. "custom:name"), in module order."""
+    sizes = {}
+    for section_id, start, end in iter_sections(buf):
+        if section_id == 0:
+            name = "custom:" + read_name(buf, start)[0]
+        else:
+            name = _SECTION_NAMES[section_id] if section_id < len(_SECTION_NAMES) else f"unknown:{section_id}"
+        sizes[name] = sizes.get(name, 0) + end - start
+    return sizes
+
+
+def _identifiers(name):
+    """The identifiers in a (mangled or demangled) C++ function name, in order."""
+    if not name.startswith("_Z"):
+        return _IDENTIFIER.findall(name)
+    identifiers = []
+    pos = 2
+    while True:  # <length><identifier> (other parts of the mangling may yield a few meaningless identifiers)
+        match = _MANGLED_LENGTH.search(name, pos)
+        if match is None:
+            return identifiers
+        pos = match.end() + int(match.group())
+        identifiers.append(name[match.end():pos])
+
+
+def attribute_function(name, package_toolkits):
+    """The OCCT package and the OCP module a function belongs to (either may be None): the binding code of a module
+    is in its register_<module>* functions (and the pybind11 templates instantiated for its classes) and counts for
+    the package of the same name, and the code of a package uses its classes."""
+    identifiers = _identifiers(name)
+    module = package = None
+    for identifier in identifiers:
+        if identifier.startswith("register_"):
+            module = identifier[len("register_"):].split("_", 1)[0]
+            break
+    for identifier in identifiers:
+        match = _OCCT_CLASS.match(identifier)
+        candidate = match.group(1) if match else identifier
+        if candidate in package_toolkits or (match and not package_toolkits):
+            package = candidate
+            break
+    if module is None and package is not None and "pybind11" in name:
+        module = package
+    elif package is None and module in package_toolkits:  # The bindings of a package go with its toolkit
+        package = module
+    return package, module
+
+
+def attribute_source(path, package_toolkits):
+    """The OCCT package and the OCP module of a source file (either may be None), like attribute_function."""
+    match = _OCCT_SOURCE.search(path)
+    if match:
+        return match.group(1), None
+    match = _OCP_SOURCE.search(path)
+    if match and (match.group(1) in package_toolkits or (not package_toolkits and "ocp" in path.lower())):
+        return match.group(1), match.group(1)
+    return None, None
+
+
+_BASE64 = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+
+
+def _decode_vlq_mappings(mappings):
+    """Yields (generated column, source index) of each segment of the (single line) mappings of a wasm source map."""
+    column = source = 0
+    for segment in mappings.replace(";", ",").split(","):
+        values = []
+        value = shift = 0
+        for char in segment:
+            digit = _BASE64.index(char)
+            value += (digit & 31) << shift
+            if digit & 32:
+                shift += 5
+            else:
+                values.append(-(value >> 1) if value & 1 else value >> 1)
+                value = shift = 0
+        if not values:
+            continue
+        column += values[0]
+        if len(values) > 1:
+            source += values[1]
+            yield column, source
+
+
+def read_source_map_files(map_path, bodies):
+    """Maps each function index to the source file of its first mapped instruction (the offsets of the source map are
+    file offsets of the module)."""
+    with open(map_path) as f:
+        source_map = json.load(f)
+    sources = source_map.get("sources", [])
+    segments = sorted(_decode_vlq_mappings(source_map.get("mappings", "")))
+    offsets = [offset for offset, _ in segments]
+    files = {}
+    for function_index, start, end in bodies:
+        i = bisect.bisect_left(offsets, start)
+        if i < len(offsets) and offsets[i] < end and 0 <= segments[i][1] < len(sources):
+            files[function_index] = sources[segments[i][1]]
+    return files
+
+
+def load_package_toolkits(path):
+    """Reads the {toolkit: [packages]} JSON written by CMake (OCCT_PACKAGE_TOOLKITS) as {package: toolkit}."""
+    if not path or not os.path.isfile(path):
+        return {}
+    with open(path) as f:
+        return {package: toolkit for toolkit, packages in json.load(f).items() for package in packages}
+
+
+def resolve_site_functions(sites, bodies, names):
+    """Fills in the function (and name) of patched sites that only know their offsets."""
+    starts = [start for _, start, _ in bodies]
+    for site in sites:
+        if site["function"] is None:
+            i = bisect.bisect_right(starts, site["start"]) - 1
+            if i >= 0 and site["start"] < bodies[i][2]:
+                site["function"] = bodies[i][0]
+                site["name"] = names.get(bodies[i][0])
+    return sites
+
+
+def _deflated_size(path):
+    """The size of the file compressed like in the wheel (deflate), which is what users download."""
+    compressor = zlib.compressobj(6)
+    size = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(16 * 1024 * 1024), b""):
+            size += len(compressor.compress(block))
+    return size + len(compressor.flush())
+
+
+def module_report(buf, path, package_toolkits, debug_path=None, map_path=None, top=REPORT_TOP_FUNCTIONS):
+    """The size report of a module (before optimization, as only the linked module is known to have names)."""
+    bodies, names = read_module_layout(buf)
+    names_from = "name section" if names else None
+    if not names and debug_path and os.path.isfile(debug_path):
+        with open(debug_path, 'rb') as f:
+            names = read_module_layout(f.read())[1]  # Same function indices as the module
+        names_from = "debug.wasm" if names else None
+    files = {}
+    if not names and map_path and os.path.isfile(map_path):
+        files = read_source_map_files(map_path, bodies)
+        names_from = "source map" if files else None
+
+    toolkits = defaultdict(lambda: {"size": 0, "functions": 0})
+    modules = defaultdict(lambda: {"size": 0, "functions": 0})
+    functions = []
+    for function_index, start, end in bodies:
+        size = end - start
+        name = names.get(function_index)
+        if name is not None:
+            package, module = attribute_function(name, package_toolkits)
+        elif function_index in files:
+            package, module = attribute_source(files[function_index], package_toolkits)
+        else:
+            package = module = None
+        toolkit = package_toolkits.get(package, package) if package is not None else "<other>"
+        for groups, key in ((toolkits, toolkit), (modules, module or "<other>")):
+            groups[key]["size"] += size
+            groups[key]["functions"] += 1
+        functions.append((size, function_index, name or files.get(function_index), toolkit, module))
+    functions.sort(key=lambda function: (-function[0], function[1]))
+
+    def by_size(groups):
+        return dict(sorted(groups.items(), key=lambda item: (-item[1]["size"], item[0])))
+
+    return {
+        "path": path,
+        "size": len(buf),
+        "sections": section_sizes(buf),
+        "functions": len(bodies),
+        "code_size": sum(end - start for _, start, end in bodies),
+        "names_from": names_from,
+        "toolkits": by_size(toolkits),
+        "ocp_modules": by_size(modules),
+        "top_functions": [{"function": function_index, "name": name, "size": size, "toolkit": toolkit,
+                           "ocp_module": module}
+                          for size, function_index, name, toolkit, module in functions[:top]],
+    }
+
+
+def write_size_report(report_path, input_report, output_path, wasm_opt_args, sites):
+    with open(output_path, 'rb') as f:
+        output_sections = section_sizes(f.read())
+    input_report["deflated_size"] = _deflated_size(input_report["path"])
+    report = {
+        "wasm_opt_args": wasm_opt_args,
+        "input": input_report,
+        "output": {"path": output_path, "size": os.path.getsize(output_path), "sections": output_sections,
+                   "deflated_size": _deflated_size(output_path)},
+        "br_table_sites": sites,
+    }
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=1)
+
+    print(f"Size report written to: {report_path}")
+    print(f"  Module: {_format_size(report['input']['size'])} -> {_format_size(report['output']['size'])} "
+          f"(deflated: {_format_size(report['input']['deflated_size'])} -> "
+          f"{_format_size(report['output']['deflated_size'])}) with wasm-opt {' '.join(wasm_opt_args)}")
+    for title, groups in (("toolkits", input_report["toolkits"]), ("OCP modules", input_report["ocp_modules"])):
+        biggest = ", ".join(f"{key} {_format_size(group['size'])}" for key, group in list(groups.items())[:10])
+        print(f"  Biggest {title} (code before optimization): {biggest}")
+    return report
+
+
+def _format_size(size):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024 or unit == "MiB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def diff_reports(old, new, top=20):
+    """Describes the size changes between two reports (see write_size_report), biggest changes first."""
+    lines = []
+    for title, key in (("Module", "size"), ("Deflated module", "deflated_size")):
+        for stage in ("input", "output"):
+            before, after = old[stage].get(key), new[stage].get(key)
+            if before is not None and after is not None:
+                percent = f" ({(after - before) / before:+.2%})" if before else ""
+                lines.append(f"{title} ({stage}): {_format_size(before)} -> {_format_size(after)} "
+                             f"[{after - before:+d} B]{percent}")
+    lines.append(f"Patched br_table sites: {len(old['br_table_sites'])} -> {len(new['br_table_sites'])}")
+    if old["wasm_opt_args"] != new["wasm_opt_args"]:
+        lines.append(f"wasm-opt arguments: {' '.join(old['wasm_opt_args'])} -> {' '.join(new['wasm_opt_args'])}")
+
+    def sizes(groups):
+        return {key: value["size"] if isinstance(value, dict) else value for key, value in groups.items()}
+
+    top_functions = ({f["name"] or f"<function {f['function']}>": f["size"] for f in old["input"]["top_functions"]},
+                     {f["name"] or f"<function {f['function']}>": f["size"] for f in new["input"]["top_functions"]})
+    for title, before, after in (("Sections (output)", sizes(old["output"]["sections"]),
+                                  sizes(new["output"]["sections"])),
+                                 ("OCCT toolkits (input code)", sizes(old["input"]["toolkits"]),
+                                  sizes(new["input"]["toolkits"])),
+                                 ("OCP modules (input code)", sizes(old["input"]["ocp_modules"]),
+                                  sizes(new["input"]["ocp_modules"])),
+                                 ("Top functions (input code)", *top_functions)):
+        changes = [(after.get(key, 0) - before.get(key, 0), key) for key in set(before) | set(after)]
+        changes = sorted((change for change in changes if change[0]), key=lambda change: (-abs(change[0]), change[1]))
+        if not changes:
+            continue
+        lines.append(f"{title}:")
+        for delta, key in changes[:top]:
+            state = " (new)" if key not in before else " (removed)" if key not in after else ""
+            lines.append(f"  {delta:+12d} B  {key}{state}")
+        if len(changes) > top:
+            lines.append(f"  ... and {len(changes) - top} more")
+    return lines
+
+
+def diff_main(args):
+    parser = argparse.ArgumentParser(prog="repair_wasm.py --diff", description="Compares two size reports.")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--top", type=int, default=20, help="number of changes to show per category")
+    parser.add_argument("--max-growth", type=float, default=None, metavar="PERCENT",
+                        help="fail if the deflated optimized module grew by more than this percentage")
+    args = parser.parse_args(args)
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print("\n".join(diff_reports(old, new, args.top)))
+    if args.max_growth is not None:
+        before, after = old["output"]["deflated_size"], new["output"]["deflated_size"]
+        if after > before * (1 + args.max_growth / 100):
+            print(f"The deflated module grew by {(after - before) / before:.2%}, more than {args.max_growth}%")
+            return 1
+    return 0
+
+
+# ----- Optimized artifact cache -----
+# Repairing and optimizing is deterministic, so the results are kept in a persistent directory (WASM_OPT_CACHE_DIR)
+# keyed on everything that affects them: the input module, the wasm-opt version and flags, and this script itself.
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(16 * 1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def wasm_opt_cache_key(input_path, wasm_opt_args):
+    wasm_opt_version = subprocess.run(['wasm-opt', '--version'], capture_output=True, text=True, check=True).stdout
+    key = hashlib.sha256()
+    for part in (_file_sha256(input_path), wasm_opt_version.strip(), " ".join(wasm_opt_args),
+                 os.environ.get("REPAIR_WASM_MODE", "").lower(), _file_sha256(os.path.abspath(__file__))):
+        key.update(part.encode() + b"\0")
+    return key.hexdigest()
+
+
+def report_cache_key():
+    """What the size report depends on besides the module (which is already part of the cache key)."""
+    path = os.environ.get("OCCT_PACKAGE_TOOLKITS")
+    return _file_sha256(path) if path and os.path.isfile(path) else "no-toolkits"
+
+
+def _cached_report_key(entry_dir):
+    key_path = os.path.join(entry_dir, "report.key")
+    if not os.path.isfile(os.path.join(entry_dir, "report.json")) or not os.path.isfile(key_path):
+        return None
+    with open(key_path) as f:
+        return f.read().strip()
+
+
+def restore_from_cache(cache_dir, key, output_path, report_path=None, report_key=None):
+    """Restores a cached module (and its size report, if requested: entries without a matching one are misses)."""
+    entry_dir = os.path.join(cache_dir, key)
+    cached_path = os.path.join(entry_dir, "module.wasm")
+    if not os.path.isfile(cached_path):
+        return False
+    if report_path and _cached_report_key(entry_dir) != report_key:
+        print("The cached module has no (up to date) size report")
+        return False
+    shutil.copy(cached_path, output_path)
+    if os.path.isfile(cached_path + '.map'):
+        shutil.copy(cached_path + '.map', output_path + '.map')
+    if report_path:
+        shutil.copy(os.path.join(entry_dir, "report.json"), report_path)
+    os.utime(entry_dir)  # Mark as recently used
+    return True
+
+
+def store_in_cache(cache_dir, key, output_path, max_entries, report_path=None, report_key=None):
+    entry_dir = os.path.join(cache_dir, key)
+    tmp_dir = entry_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    shutil.copy(output_path, os.path.join(tmp_dir, "module.wasm"))
+    if os.path.isfile(output_path + '.map'):
+        shutil.copy(output_path + '.map', os.path.join(tmp_dir, "module.wasm.map"))
+    if report_path and os.path.isfile(report_path):
+        shutil.copy(report_path, os.path.join(tmp_dir, "report.json"))
+        with open(os.path.join(tmp_dir, "report.key"), 'w') as f:
+            f.write(report_key)
+    shutil.rmtree(entry_dir, ignore_errors=True)
+    os.rename(tmp_dir, entry_dir)  # Never leave partial entries behind
+
+    # Evict the least recently used entries, as each one can be hundreds of MB
+    entries = sorted((os.path.join(cache_dir, e) for e in os.listdir(cache_dir) if not e.endswith(".tmp")),
+                     key=os.path.getmtime, reverse=True)
+    for old_entry in entries[max_entries:]:
+        print(f"Evicting old cache entry: {old_entry}")
+        shutil.rmtree(old_entry, ignore_errors=True)
+
+
+def repair_and_optimize_wasm(input_path, output_path):
     is_debug = os.environ.get("DEBUG", "").lower() in {"1", "on", "true", "yes"}
-    wasm_opt_args = ["-O0", "--debuginfo"] if is_debug else ["-O4"] if os.environ.get("CI", "").lower() in {"1", "on", "true", "yes"} else ["-O1"]
+    wasm_opt_args = ['--no-validation'] + wasm_feature_args() + ['--post-emscripten'] + (
+        ["-O0", "--debuginfo"] if is_debug else ["-O4"] if os.environ.get("CI", "").lower() in {"1", "on", "true", "yes"} else ["-O1"])
+
+    report_path = os.environ.get("WASM_SIZE_REPORT")
+    cache_dir = os.environ.get("WASM_OPT_CACHE_DIR")
+    cache_key = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_key = wasm_opt_cache_key(input_path, wasm_opt_args)
+        if restore_from_cache(cache_dir, cache_key, output_path, report_path, report_cache_key()):
+            print(f"Restored optimized WebAssembly from cache ({cache_key}) to: {output_path}")
+            return
+        print(f"Cache miss ({cache_key}), repairing and optimizing...")
+
+    print(f"Copying and repairing: {input_path}")
+    with open(input_path, 'rb') as f:
+        wasm_bytes = bytearray(f.read())
+
+    fixed_path = input_path + '.fixed.wasm'
+    optimize_input_path = fixed_path
+
+    # REPAIR_WASM_MODE=iterative restores the old (slow) behavior of asking wasm-opt for each error
+    sites = None
+    if os.environ.get("REPAIR_WASM_MODE", "").lower() != "iterative":
+        try:
+            sites = repair_wasm_single_pass(input_path, wasm_bytes)
+        except (RuntimeError, IndexError) as e:
+            print(f"Single-pass repair failed ({e}), falling back to iterative repair...")
+            with open(input_path, 'rb') as f:
+                wasm_bytes = bytearray(f.read())
+    if sites is None:
+        wasm_bytes, sites = repair_wasm_iteratively(wasm_bytes, fixed_path)
+    elif sites:
+        with open(fixed_path, 'wb') as f:
+            f.write(wasm_bytes)
+    else:
+        optimize_input_path = input_path  # Nothing to patch
 
-    print("Patching complete. Starting optimization (" + str(wasm_opt_args) + ")...")
+    # The .debug.wasm file (separate DWARF) is not shipped, as it makes the wheel too large and would have to be
+    # repaired like above (which requires too many resources), but its names can attribute the report
+    possible_debug_file = input_path[:-3] + '.wasm.debug.wasm'
+    possible_map_file = input_path + '.map'
+    input_report = None
+    if report_path:
+        print("Attributing the module size for the report...")
+        package_toolkits = load_package_toolkits(os.environ.get("OCCT_PACKAGE_TOOLKITS"))
+        input_report = module_report(wasm_bytes, input_path, package_toolkits, possible_debug_file, possible_map_file)
+        if any(site["function"] is None for site in sites):  # Iterative repair
+            resolve_site_functions(sites, *read_module_layout(wasm_bytes))
+    del wasm_bytes  # Frees hundreds of MB for wasm-opt
+
+    if _env_flag("WASM_VALIDATE"):
+        print("Patching complete. Validating the repaired module...")
+        validate_wasm(optimize_input_path)
+
+    print("Starting optimization (" + str(wasm_opt_args) + ")...")
 
     subprocess.run(
-        ['wasm-opt', '--no-validation', '--enable-exception-handling', '--post-emscripten'] +
-        wasm_opt_args + [fixed_path, '-o', output_path],
+        ['wasm-opt'] + wasm_opt_args + [optimize_input_path, '-o', output_path],
         check=True
     )
-    
-    # Makes wheel too large and would have to be fixed by wasm-opt 
-    # like above (but requires too many resources...)
-    possible_debug_file = input_path[:-3] + '.wasm.debug.wasm'
-    if False and os.path.isfile(possible_map_file):
-        print("Also copying .debug.wasm file with debug information")
-        shutil.copy(possible_map_file, output_path[:-3] + '.wasm.debug.wasm')
-    
-    possible_map_file = input_path + '.map'
+
     if os.path.isfile(possible_map_file):
         print("Also copying map file with debug information")
         shutil.copy(possible_map_file, output_path + '.map')
 
-    os.remove(fixed_path)
+    if os.path.isfile(fixed_path):
+        os.remove(fixed_path)
     print(f"Optimized WebAssembly written to: {output_path}")
 
+    if input_report is not None:
+        write_size_report(report_path, input_report, output_path, wasm_opt_args, sites)
+
+    if cache_key is not None:
+        store_in_cache(cache_dir, cache_key, output_path, int(os.environ.get("WASM_OPT_CACHE_MAX_ENTRIES", "3")),
+                       report_path, report_cache_key())
+
 def ext_suffix():
     import sysconfig
     suffix = sysconfig.get_config_var("EXT_SUFFIX")
@@ -88,8 +828,11 @@ def ext_suffix():
     return suffix
 
 if __name__ == '__main__':
+    if len(sys.argv) >= 2 and sys.argv[1] == '--diff':
+        sys.exit(diff_main(sys.argv[2:]))
     if len(sys.argv) != 3:
         print("Usage: python repair_and_optimize_wasm.py <input_dir> <output_dir>")
+        print("       python repair_and_optimize_wasm.py --diff <old_report.json> <new_report.json>")
         sys.exit(1)
         
     # Find the actual input and output paths... (CMake is hard)
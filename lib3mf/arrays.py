@@ -0,0 +1,87 @@
+"""Bulk transfer of mesh geometry between lib3mf and NumPy arrays (or any other buffer-protocol object).
+
+MeshObject.SetGeometry/GetVertices/GetTriangleIndices build one ctypes structure per vertex and triangle, which
+dominates the export time of big meshes (especially in Pyodide). These helpers pass whole buffers in a single call:
+
+    from lib3mf.arrays import get_geometry, set_geometry  # Not imported by lib3mf itself, to avoid importing NumPy
+    set_geometry(mesh, vertices, triangles)  # (N, 3) float32 and (M, 3) uint32, also available as mesh.set_geometry
+    vertices, triangles = get_geometry(mesh)
+
+Without NumPy, any contiguous buffer of float32 (vertices) and 32-bit integers (triangles) is accepted, and
+memoryviews of shape (N, 3) are returned.
+"""
+import array
+import ctypes
+
+from .Lib3MF import MeshObject, Position, Triangle
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+_FORMATS = {"f": ("f",), "I": ("I", "i", "L", "l")}
+
+
+def _as_pointer(data, fmt, struct_type):
+    """Returns (keep_alive, pointer, count) for a contiguous buffer of count rows of 3 fmt items, copying if needed."""
+    if np is not None and not isinstance(data, (bytes, bytearray, memoryview, array.array)):
+        data = np.ascontiguousarray(data, dtype=np.float32 if fmt == "f" else np.uint32)
+        if data.size % 3 != 0:
+            raise ValueError(f"Expected rows of 3 items, got an array of shape {data.shape}")
+        return data, data.ctypes.data_as(ctypes.POINTER(struct_type)), data.size // 3
+
+    view = memoryview(data)
+    if not view.c_contiguous:
+        raise ValueError("A contiguous buffer is required")
+    item_format = view.format.lstrip("@=<")
+    if view.itemsize != 4 or item_format not in _FORMATS[fmt]:
+        raise ValueError(f"Expected a buffer of 4-byte '{fmt}' items, got '{view.format}' ({view.itemsize} bytes)")
+    if view.nbytes % ctypes.sizeof(struct_type) != 0:
+        raise ValueError(f"Expected rows of 3 items, got {view.nbytes // 4} items")
+    if view.readonly:
+        buffer = (ctypes.c_char * view.nbytes).from_buffer_copy(view)
+    else:
+        buffer = (ctypes.c_char * view.nbytes).from_buffer(view)
+    return buffer, ctypes.cast(buffer, ctypes.POINTER(struct_type)), view.nbytes // ctypes.sizeof(struct_type)
+
+
+def _new_rows(fmt, count):
+    """Returns (result, pointer) for a new uninitialized (count, 3) array of fmt items."""
+    if np is not None:
+        result = np.empty((count, 3), dtype=np.float32 if fmt == "f" else np.uint32)
+        return result, result.ctypes.data
+    storage = array.array(fmt, bytes(count * 3 * 4))
+    if count == 0:  # memoryviews can't have a (0, 3) shape
+        return memoryview(storage), storage.buffer_info()[0]
+    return memoryview(storage).cast("B").cast(fmt, [count, 3]), storage.buffer_info()[0]
+
+
+def set_geometry(mesh: MeshObject, vertices, triangles):
+    """Replaces the geometry of the mesh with (N, 3) float32 vertices and (M, 3) uint32 triangle indices."""
+    vertices_data, vertices_pointer, vertex_count = _as_pointer(vertices, "f", Position)
+    triangles_data, triangles_pointer, triangle_count = _as_pointer(triangles, "I", Triangle)
+    lib = mesh._wrapper.lib
+    mesh._wrapper.checkError(mesh, lib.lib3mf_meshobject_setgeometry(
+        mesh._handle, ctypes.c_uint64(vertex_count), vertices_pointer,
+        ctypes.c_uint64(triangle_count), triangles_pointer))
+
+
+def get_geometry(mesh: MeshObject):
+    """Returns the (N, 3) float32 vertices and (M, 3) uint32 triangle indices of the mesh."""
+    lib = mesh._wrapper.lib
+    needed = ctypes.c_uint64(0)
+
+    vertices, address = _new_rows("f", mesh.GetVertexCount())
+    mesh._wrapper.checkError(mesh, lib.lib3mf_meshobject_getvertices(
+        mesh._handle, ctypes.c_uint64(len(vertices)), needed, ctypes.cast(address, ctypes.POINTER(Position))))
+
+    triangles, address = _new_rows("I", mesh.GetTriangleCount())
+    mesh._wrapper.checkError(mesh, lib.lib3mf_meshobject_gettriangleindices(
+        mesh._handle, ctypes.c_uint64(len(triangles)), needed, ctypes.cast(address, ctypes.POINTER(Triangle))))
+
+    return vertices, triangles
+
+
+MeshObject.set_geometry = set_geometry
+MeshObject.get_geometry = get_geometry
@@ -0,0 +1,107 @@
+"""Makes the (already patched) Lib3MF.py wrapper resolve each lib3mf_* function on first use.
+
+The generated wrapper looks up and builds the ctypes prototype of every C function (hundreds of them) whenever a Wrapper
+is created, which is slow in Pyodide. Both function table loaders are replaced by a LazyFunctionTable that does it on
+first access, using a single table of prototypes taken from the (32-bit corrected) _loadFunctionTable.
+
+Usage: python3 lazy_lib3mf.py path/to/Lib3MF.py
+"""
+import re
+import sys
+
+LAZY_MARKER = "class LazyFunctionTable:"
+
+WRAPPER_START = "'''Wrapper Class Implementation\n'''\nclass Wrapper:\n"
+
+LAZY_TABLE = """'''Lazily resolved function table
+'''
+class LazyFunctionTable:
+	'''Resolves (and caches) each lib3mf_* function on first use, as resolving all of them eagerly slows down startup
+	'''
+	def __init__(self, resolve):
+		self._resolve = resolve
+
+	def __getattr__(self, name):
+		prototype = _FUNCTION_PROTOTYPES.get(name)
+		if prototype is None:
+			raise AttributeError(name)
+		restype, argtypes = prototype()
+		method = self._resolve(name, restype, argtypes)
+		setattr(self, name, method)
+		return method
+
+
+"""
+
+LAZY_LOADERS = """	def _loadFunctionTableFromMethod(self, symbolLookupMethodAddress):
+		symbolLookupMethodType = ctypes.CFUNCTYPE(ctypes.c_int32, ctypes.c_char_p, ctypes.POINTER(ctypes.c_void_p))
+		symbolLookupMethod = symbolLookupMethodType(int(symbolLookupMethodAddress))
+
+		def resolve(name, restype, argtypes):
+			methodAddress = ctypes.c_void_p()
+			err = symbolLookupMethod(ctypes.c_char_p(str.encode(name)), methodAddress)
+			if err != 0:
+				raise ELib3MFException(ErrorCodes.COULDNOTLOADLIBRARY, str(err))
+			return ctypes.CFUNCTYPE(restype, *argtypes)(int(methodAddress.value))
+
+		self.lib = LazyFunctionTable(resolve)
+
+	def _loadFunctionTable(self):
+		library = self.lib
+
+		def resolve(name, restype, argtypes):
+			try:
+				method = getattr(library, name)
+			except AttributeError as ae:
+				raise ELib3MFException(ErrorCodes.COULDNOTFINDLIBRARYEXPORT, ae.args[0])
+			method.restype = restype
+			method.argtypes = argtypes
+			return method
+
+		self.lib = LazyFunctionTable(resolve)
+
+"""
+
+
+def make_lazy(source: str) -> str:
+    if LAZY_MARKER in source:
+        return source
+
+    loaders_start = source.find("\tdef _loadFunctionTableFromMethod(self, symbolLookupMethodAddress):\n")
+    table_start = source.find("\tdef _loadFunctionTable(self):\n")
+    loaders_end = source.find("\tdef _checkBinaryVersion(self):\n")
+    if not (0 <= loaders_start < table_start < loaders_end) or WRAPPER_START not in source:
+        raise RuntimeError("Unexpected Lib3MF.py structure, can't make the function table lazy")
+
+    # The plain ctypes loader lists the (corrected) prototype of every function
+    table = source[table_start:loaders_end]
+    restypes = dict(re.findall(r"self\.lib\.(\w+)\.restype = (.+)", table))
+    argtypes = dict(re.findall(r"self\.lib\.(\w+)\.argtypes = (\[.*])", table))
+    if not restypes or restypes.keys() != argtypes.keys():
+        raise RuntimeError("Unexpected _loadFunctionTable contents, can't make the function table lazy")
+    missing = set(re.findall(r'str\.encode\("(\w+)"\)', source[loaders_start:table_start])) - restypes.keys()
+    if missing:
+        raise RuntimeError(f"Functions without a prototype in _loadFunctionTable: {sorted(missing)}")
+
+    prototypes = "'''Function prototypes (restype, argtypes), only built when a function is first resolved\n'''\n"
+    prototypes += "_FUNCTION_PROTOTYPES = {\n"
+    for name, restype in restypes.items():
+        prototypes += f"\t'{name}': lambda: ({restype}, {argtypes[name]}),\n"
+    prototypes += "}\n\n"
+
+    source = source[:loaders_start] + LAZY_LOADERS + source[loaders_end:]
+    return source.replace(WRAPPER_START, prototypes + LAZY_TABLE + WRAPPER_START, 1)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    path = sys.argv[1]
+    with open(path) as f:
+        original = f.read()
+    lazy = make_lazy(original)
+    if lazy != original:
+        with open(path, "w") as f:
+            f.write(lazy)
+        print(f"Made the function table of {path} lazy ({lazy.count(chr(10))} lines, was {original.count(chr(10))})")
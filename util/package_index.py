@@ -5,11 +5,16 @@ import argparse
 import datetime
 import difflib
 import hashlib
+import html
 import json
 import logging
 import os
+import re
 import shutil
+import subprocess
 import urllib.request
+import zipfile
+from email.parser import BytesParser
 from collections import defaultdict
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Set, Tuple
@@ -31,6 +36,79 @@ def parse_wheel_filename(filename: str) -> Tuple[str, str, str]:
     return name, version, python_version
 
 
+def file_digests(path: Path) -> Tuple[str, str]:
+    """Returns the sha256 and the git blob id (as in `git hash-object`) of a file, reading it once."""
+    digest = hashlib.sha256()
+    blob = hashlib.sha1(f"blob {path.stat().st_size}\0".encode())
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+            blob.update(block)
+    return digest.hexdigest(), blob.hexdigest()
+
+
+def git_blob_ids(directory: Path) -> Dict[str, str]:
+    """Returns the blob id of every wheel under directory (by path relative to it) that git tracks unmodified.
+
+    A fresh checkout (e.g. of gh-pages in CI) resets all mtimes, so these recognize the unchanged wheels instead."""
+    def git(*args: str) -> List[str]:
+        result = subprocess.run(["git", "-C", str(directory), *args, "--", "*.whl"], capture_output=True)
+        if result.returncode != 0:
+            raise OSError(result.stderr.decode(errors="replace"))
+        return [entry for entry in result.stdout.decode().split("\0") if entry]
+
+    try:
+        modified = set(git("ls-files", "-z", "--modified"))
+        staged = git("ls-files", "-z", "--stage")
+    except OSError:  # Not a git repository (or no git)
+        return {}
+    blobs = {}
+    for entry in staged:
+        info, path = entry.split("\t", 1)
+        if path not in modified:
+            blobs[path] = info.split()[1]
+    return blobs
+
+
+def read_wheel_metadata(wheel_path: Path) -> bytes:
+    """Returns the raw core metadata (.dist-info/METADATA) of a wheel."""
+    with zipfile.ZipFile(wheel_path) as zf:
+        for entry in zf.namelist():
+            parts = entry.split('/')
+            if len(parts) == 2 and parts[0].endswith('.dist-info') and parts[1] == 'METADATA':
+                return zf.read(entry)
+    raise ValueError("No .dist-info/METADATA found in wheel: " + str(wheel_path))
+
+
+def describe_wheel(wheel_path: Path, base_url: str, package: str) -> Dict[str, Any]:
+    """Writes the PEP 658 metadata sidecar of a wheel and returns its PEP 691 file entry."""
+    metadata = read_wheel_metadata(wheel_path)
+    metadata_path = wheel_path.with_name(wheel_path.name + ".metadata")
+    if not metadata_path.exists() or metadata_path.read_bytes() != metadata:
+        metadata_path.write_bytes(metadata)
+    metadata_hash = {"sha256": hashlib.sha256(metadata).hexdigest()}
+    requires_python = BytesParser().parsebytes(metadata, headersonly=True).get("Requires-Python")
+    sha256, git_blob = file_digests(wheel_path)
+    return {
+        "filename": wheel_path.name,
+        "url": f"{base_url}/{package}/{wheel_path.name}",
+        "hashes": {"sha256": sha256},
+        "git_blob": git_blob,  # Only kept in the manifest
+        "requires-python": requires_python,
+        "core-metadata": metadata_hash,
+        "dist-info-metadata": metadata_hash,  # Name used before PEP 714
+        "size": wheel_path.stat().st_size,
+    }
+
+
+def html_link(file: Dict[str, Any]) -> str:
+    attrs = f' data-dist-info-metadata="sha256={file["core-metadata"]["sha256"]}"'
+    attrs += f' data-core-metadata="sha256={file["core-metadata"]["sha256"]}"'
+    if file["requires-python"]:
+        attrs += f' data-requires-python="{html.escape(file["requires-python"])}"'
+    return f'<a href="{file["url"]}#sha256={file["hashes"]["sha256"]}"{attrs}>{file["filename"]}</a><br/>\n'
+
+
 def detect_github_pages_url() -> Optional[str]:
     repo = os.environ.get("GITHUB_REPOSITORY")
     if repo:
@@ -39,11 +117,213 @@ def detect_github_pages_url() -> Optional[str]:
     return None
 
 
-def build_static_repo(wheel_dirs: List[str], output_dir: str, base_url: str) -> None:
-    out_path = Path(output_dir)
+def place_wheel(source: Path, dest: Path) -> None:
+    """Makes dest a copy of source, sharing the data (hardlink or reflink) when the filesystem allows it."""
+    tmp_dest = dest.with_name(dest.name + ".tmp")
+    if tmp_dest.exists():
+        tmp_dest.unlink()
+    try:
+        os.link(source, tmp_dest)
+    except OSError:
+        try:
+            import fcntl
+            with source.open("rb") as f_src, tmp_dest.open("wb") as f_dest:
+                fcntl.ioctl(f_dest.fileno(), 0x40049409, f_src.fileno())  # FICLONE (reflink, e.g. btrfs/xfs)
+            shutil.copystat(source, tmp_dest)
+        except (OSError, ImportError):
+            shutil.copy2(source, tmp_dest)
+    os.replace(tmp_dest, dest)
+
+
+def write_if_changed(path: Path, content: str) -> bool:
+    if path.exists() and path.read_text() == content:
+        return False
+    path.write_text(content)
+    return True
+
+
+def load_manifest(manifest_path: Path) -> Dict[str, Dict[str, Any]]:
+    if not manifest_path.exists():
+        return {}
+    try:
+        return json.loads(manifest_path.read_text())["wheels"]
+    except (ValueError, KeyError) as e:
+        log.warning(f"Ignoring invalid manifest {manifest_path}: {e}")
+        return {}
+
+
+PYODIDE_CDN_URL = "https://cdn.jsdelivr.net/pyodide/v{version}/full/"
+MOCKED_PACKAGES = {"py-lib3mf"}  # Mocked by bootstrap_in_pyodide.py instead of installed
+
+
+def fetch_json(url: str) -> Any:
+    with urllib.request.urlopen(url) as response:
+        return json.load(response)
+
+
+def is_wheel_supported(filename: str, python_tag: str, abi_version: Optional[str]) -> bool:
+    python_tags, abi_tag, platform_tag = filename[:-len(".whl")].split('-')[-3:]
+    if not set(python_tags.split('.')) & {python_tag, "py3", "py" + python_tag[2:]}:
+        return False
+    if abi_tag not in ("none", "abi3", python_tag):
+        return False
+    if platform_tag == "any":
+        return True
+    if abi_version is not None and platform_tag.startswith("pyodide_"):
+        return platform_tag == f"pyodide_{abi_version}_wasm32"
+    return platform_tag.startswith(("pyodide_", "emscripten_")) and platform_tag.endswith("_wasm32")
+
+
+def wheel_imports(wheel_path: Path) -> List[str]:
+    """Returns the top-level importable names of a wheel."""
+    with zipfile.ZipFile(wheel_path) as zf:
+        names = zf.namelist()
+        for entry in names:
+            parts = entry.split('/')
+            if len(parts) == 2 and parts[0].endswith('.dist-info') and parts[1] == 'top_level.txt':
+                return sorted({line.strip() for line in zf.read(entry).decode().splitlines() if line.strip()})
+    top_level = {entry.split('/')[0].split('.')[0] for entry in names
+                 if not entry.split('/')[0].endswith(('.dist-info', '.data'))}
+    return sorted(name for name in top_level if name.isidentifier())
+
+
+def generate_pyodide_locks(requirements: List[str], local_wheels: Dict[str, List[Tuple[Dict[str, Any], Path]]],
+                           pyodide_version: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Pins the whole dependency closure of requirements, preferring (like micropip) the packages of the Pyodide
+    distribution, then the wheels of this index, then pure-python wheels from PyPI.
+
+    Returns a full pyodide-lock.json (the distribution lock plus the closure, for loadPyodide's lockFileURL) and a
+    micropip.freeze()-style lock with only the closure (for the lockfile mode of bootstrap_in_pyodide.py).
+    """
+    from packaging.markers import default_environment
+    from packaging.requirements import Requirement
+    from packaging.specifiers import SpecifierSet
+    from packaging.utils import canonicalize_name
+    from packaging.version import Version
+
+    cdn_url = PYODIDE_CDN_URL.format(version=pyodide_version)
+    log.info(f"🔒 Resolving {requirements} for Pyodide {pyodide_version}...")
+    dist_lock = fetch_json(cdn_url + "pyodide-lock.json")
+    python_version = dist_lock["info"]["python"]
+    python_tag = "cp" + "".join(python_version.split(".")[:2])
+    abi_version = dist_lock["info"].get("abi_version")
+    env = default_environment()
+    env.update(sys_platform="emscripten", platform_system="Emscripten", platform_machine="wasm32", os_name="posix",
+               implementation_name="cpython", platform_python_implementation="CPython",
+               python_version=".".join(python_version.split(".")[:2]), python_full_version=python_version)
+
+    closure: Dict[str, Dict[str, Any]] = {}
+    requires: Dict[str, List[Any]] = {}
+    extras: Dict[str, Set[str]] = defaultdict(lambda: {""})
+
+    def is_required(req: Any, package_extras: Set[str]) -> bool:
+        return req.marker is None or any(req.marker.evaluate(dict(env, extra=extra)) for extra in package_extras)
+
+    def resolve(name: str, specifier: Any) -> Tuple[Dict[str, Any], List[Any]]:
+        dist_package = dist_lock["packages"].get(name)
+        if dist_package is not None and specifier.contains(dist_package["version"], prereleases=True):
+            return dict(dist_package), [Requirement(dep) for dep in dist_package["depends"]]
+
+        candidates = [(Version(parse_wheel_filename(file["filename"])[1]), file, path)
+                      for file, path in local_wheels.get(name, [])
+                      if is_wheel_supported(file["filename"], python_tag, abi_version)]
+        candidates = [c for c in candidates if specifier.contains(c[0], prereleases=True)]
+        if candidates:
+            version, file, path = max(candidates, key=lambda c: c[0])
+            metadata = path.with_name(path.name + ".metadata").read_bytes()
+            requires_dist = BytesParser().parsebytes(metadata, headersonly=True).get_all("Requires-Dist") or []
+            return {"name": name, "version": str(version), "file_name": file["url"], "install_dir": "site",
+                    "sha256": file["hashes"]["sha256"], "package_type": "package", "imports": wheel_imports(path),
+                    "depends": [], "unvendored_tests": False, "shared_library": False}, \
+                [Requirement(r) for r in requires_dist]
+
+        releases = fetch_json(f"https://pypi.org/pypi/{name}/json")["releases"]
+        pure_wheels = {}
+        for version_str, release_files in releases.items():
+            for file in release_files:
+                if file["filename"].endswith(".whl") and not file.get("yanked") \
+                        and is_wheel_supported(file["filename"], python_tag, abi_version) \
+                        and SpecifierSet(file.get("requires_python") or "").contains(python_version):
+                    pure_wheels[version_str] = file
+        versions = list(specifier.filter(pure_wheels))
+        if not versions:
+            raise ValueError(f"No compatible wheel found for {name}{specifier}")
+        version_str = max(versions, key=Version)
+        file = pure_wheels[version_str]
+        requires_dist = fetch_json(f"https://pypi.org/pypi/{name}/{version_str}/json")["info"]["requires_dist"] or []
+        return {"name": name, "version": version_str, "file_name": file["url"], "install_dir": "site",
+                "sha256": file["digests"]["sha256"], "package_type": "package", "imports": [], "depends": [],
+                "unvendored_tests": False, "shared_library": False}, [Requirement(r) for r in requires_dist]
+
+    queue = [Requirement(r) for r in requirements]
+    while queue:
+        req = queue.pop(0)
+        name = canonicalize_name(req.name)
+        if name in MOCKED_PACKAGES:
+            continue
+        if name in closure:
+            if not req.specifier.contains(closure[name]["version"], prereleases=True):
+                log.warning(f"Pinned {name}=={closure[name]['version']} does not satisfy {req}")
+            new_extras = set(req.extras) - extras[name]
+            if not new_extras:
+                continue
+            extras[name] |= new_extras
+            queue.extend(r for r in requires[name] if is_required(r, new_extras))
+            continue
+        closure[name], requires[name] = resolve(name, req.specifier)
+        extras[name] |= set(req.extras)
+        log.info(f"📌 {name}=={closure[name]['version']}")
+        queue.extend(r for r in requires[name] if is_required(r, extras[name]))
+
+    for name, package in closure.items():
+        if name not in dist_lock["packages"] or "://" in package["file_name"]:
+            package["depends"] = sorted({canonicalize_name(r.name) for r in requires[name]
+                                         if is_required(r, extras[name]) and canonicalize_name(r.name) in closure})
+
+    closure_lock = {"info": dist_lock["info"], "packages": dict(sorted(closure.items()))}
+    full_packages = {name: dict(package, file_name=cdn_url + package["file_name"])
+                     for name, package in dist_lock["packages"].items()}
+    for name, package in closure.items():
+        if "://" in package["file_name"]:
+            full_packages[name] = package
+    full_lock = {"info": dist_lock["info"], "packages": dict(sorted(full_packages.items()))}
+    return full_lock, closure_lock
+
+
+def variant_name(artifact_dir: str) -> str:
+    """Returns the build variant of the wheels in a CI artifact directory (wheel-<package>-<build type>[-<variant>]).
+
+    Each variant is published as a separate index at <base url>/<variant>/ with the original package names and
+    metadata, so that installers accept its wheels and they still satisfy requirements on the original packages.
+    For example, wheel-cadquery-ocp-novtk-Debug -> debug and wheel-cadquery-ocp-novtk-Release-core -> core.
+    """
+    match = re.search(r"-(Release|Debug)((?:-[a-z0-9]+)*)$", artifact_dir)
+    if match is None:
+        return ""
+    variants = [variant for variant in match.group(2).split("-") if variant]
+    if match.group(1) == "Debug":
+        variants.append("debug")
+    return "-".join(variants)
+
+
+def build_static_repo(wheel_dirs: List[str], output_dir: str, base_url: str, incremental: bool = True,
+                      jobs: Optional[int] = None, lock_requirements: Optional[List[str]] = None,
+                      pyodide_version: Optional[str] = None) -> None:
+    """Builds (or incrementally updates) the static index at output_dir.
 
-    packages: Dict[str, Set[str]] = defaultdict(set)
+    A manifest (manifest.json) remembers the hash, metadata and stat of every published wheel, so unchanged wheels
+    are neither hashed nor copied again, new wheels are hashed in parallel and only the changed pages are rewritten.
+    Unchanged wheels are recognized by their size and mtime or, if output_dir is a git checkout (where the mtimes are
+    those of the checkout), by the blob id that git tracks for them.
+    """
+    out_path = Path(output_dir)
+    out_path.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_path / "manifest.json"
+    manifest = load_manifest(manifest_path) if incremental else {}
 
+    # Find all wheels first (package directory -> published filename -> source path), where the package directory is
+    # <package> in the main index or <variant>/<package> in the index of a variant
+    sources: Dict[str, Dict[str, Path]] = defaultdict(dict)
     for wheel_dir in wheel_dirs:
         path = Path(wheel_dir)
         if not path.exists():
@@ -51,53 +331,117 @@ def build_static_repo(wheel_dirs: List[str], output_dir: str, base_url: str) ->
             continue
 
         for wheel_path in path.glob("**/*.whl"):
-            # Auto-install debug builds with _debug suffix on wheel package name
-            new_wheel_path = None
-            if wheel_path.parent.name.endswith('-Debug'):
-                name, version, _ = parse_wheel_filename(wheel_path.name)
-                new_wheel_path = wheel_path.parent / (str(wheel_path.name).replace(name, name + "_debug", 1))
-                if not new_wheel_path.exists():
-                    shutil.copy2(wheel_path, new_wheel_path)
-                wheel_path = new_wheel_path
-                
-            name, version, _ = parse_wheel_filename(wheel_path.name)
+            fname = wheel_path.name
+            name, version, _ = parse_wheel_filename(fname)
             norm_name = name.lower().replace('_', '-')
-            
-            if wheel_path.name in packages[norm_name]:
+
+            # Build variants go to their own index: from CI artifacts, or already published at <variant>/<package>/
+            variant = variant_name(wheel_path.parent.name)
+            relative_parts = wheel_path.relative_to(path).parts
+            if not variant and len(relative_parts) == 3 and relative_parts[1] == norm_name:
+                variant = relative_parts[0]
+            package_dir = f"{variant}/{norm_name}" if variant else norm_name
+
+            if fname in sources[package_dir]:
                 log.warning(f"Overriding previous wheel with the same name with {wheel_path}...")
-            packages[norm_name].add(wheel_path.name)
-
-            pkg_path = out_path / norm_name
-            pkg_path.mkdir(parents=True, exist_ok=True)
-            dest_path = pkg_path / wheel_path.name
-            if wheel_path != dest_path:
-                shutil.copy2(wheel_path, dest_path)
-                
-            if new_wheel_path is not None:
-                new_wheel_path.unlink()
-                new_wheel_path = None
-
-    with (out_path / "index.html").open("w") as f_index_all:
-        f_index_all.write('<!DOCTYPE html><html><head><title>OCP.wasm wheel registry</title></head><body>\n')
-
-        for package, filenames in sorted(packages.items()):
-            log.info(f"📦 Processing package {package} with {len(filenames)} wheels found.")
-            pkg_path = out_path / package
-            
-            with (pkg_path / "index.html").open("w") as f_index:
-                
-                f_index.write('<!DOCTYPE html><html><head><title>OCP.wasm wheel registry</title></head><body>\n')
-                
-                for fname in sorted(filenames):
-                    link = f'<a href="{base_url}/{package}/{fname}">{fname}</a><br/>\n'
-                    f_index.write(link)
-                    f_index_all.write(link)
-                    
-                f_index.write('</body></html>\n')
-
-        f_index_all.write('</body></html>\n')
-
-    log.info(f"✅ Static PyPI repo generated with {len(packages)} packages and {sum([len(p) for _, p in packages.items()])} wheels.")
+            sources[package_dir][fname] = wheel_path
+
+    # Place the wheels in the output tree, reusing the manifest entries of the ones that did not change
+    blobs = git_blob_ids(out_path) if manifest else {}
+    files: Dict[str, Dict[str, Any]] = {}
+    to_describe: List[Tuple[str, Path, str]] = []
+    for package, wheels in sources.items():
+        pkg_path = out_path / package
+        pkg_path.mkdir(parents=True, exist_ok=True)
+        for fname, source in wheels.items():
+            key = f"{package}/{fname}"
+            dest = pkg_path / fname
+            if not dest.exists() or not os.path.samefile(source, dest):
+                source_stat, dest_stat = source.stat(), dest.stat() if dest.exists() else None
+                if dest_stat is None or (source_stat.st_size, source_stat.st_mtime_ns) != (dest_stat.st_size, dest_stat.st_mtime_ns):
+                    place_wheel(source, dest)
+
+            entry = manifest.get(key)
+            dest_stat = dest.stat()
+            reusable = entry is not None and entry["size"] == dest_stat.st_size and (
+                entry["mtime_ns"] == dest_stat.st_mtime_ns or
+                (entry.get("git_blob") is not None and blobs.get(key) == entry["git_blob"]))
+            if reusable and dest.with_name(fname + ".metadata").exists():
+                files[key] = dict(entry, url=f"{base_url}/{package}/{fname}", mtime_ns=dest_stat.st_mtime_ns)
+            else:
+                to_describe.append((key, dest, package))
+
+    if len(to_describe) > 1 and jobs != 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            described = list(executor.map(describe_wheel, [d for _, d, _ in to_describe], [base_url] * len(to_describe),
+                                          [p for _, _, p in to_describe]))
+    else:
+        described = [describe_wheel(dest, base_url, package) for _, dest, package in to_describe]
+
+    added, replaced = [], []
+    for (key, dest, _), file in zip(to_describe, described):
+        files[key] = dict(file, mtime_ns=dest.stat().st_mtime_ns)
+        old_entry = manifest.get(key)
+        if old_entry is None:
+            added.append(key)
+        elif old_entry["hashes"]["sha256"] != file["hashes"]["sha256"]:
+            replaced.append(key)
+    unchanged = len(files) - len(added) - len(replaced)
+
+    # Only rewrite the pages that actually change
+    header = '<!DOCTYPE html><html><head><title>OCP.wasm wheel registry</title></head><body>\n'
+    rewritten_pages = 0
+    indexes: Dict[str, List[str]] = defaultdict(list)  # Index directory ("" or the variant) -> its package directories
+    for package_dir in sources:
+        indexes[package_dir.rpartition("/")[0]].append(package_dir)
+    for index, package_dirs in sorted(indexes.items()):
+        index_all = header
+        for package_dir in sorted(package_dirs):
+            package = package_dir.rpartition("/")[2]
+            wheels = sources[package_dir]
+            log.info(f"📦 Processing package {package_dir} with {len(wheels)} wheels found.")
+            pkg_path = out_path / package_dir
+            pkg_files = [files[f"{package_dir}/{fname}"] for fname in sorted(wheels)]
+            pkg_files_public = [{k: v for k, v in file.items() if k not in ("mtime_ns", "git_blob")}
+                                for file in pkg_files]
+
+            links = "".join(html_link(file) for file in pkg_files)
+            index_all += links
+            rewritten_pages += write_if_changed(pkg_path / "index.html", header + links + '</body></html>\n')
+
+            # PEP 691 JSON variant of the same page (static hosting can't do content negotiation, so it lives next to it)
+            versions = sorted({parse_wheel_filename(file["filename"])[1] for file in pkg_files})
+            rewritten_pages += write_if_changed(pkg_path / "index.json", json.dumps(
+                {"meta": {"api-version": "1.1"}, "name": package, "versions": versions, "files": pkg_files_public},
+                indent=1))
+
+        index_path = out_path / index
+        rewritten_pages += write_if_changed(index_path / "index.html", index_all + '</body></html>\n')
+        rewritten_pages += write_if_changed(index_path / "index.json", json.dumps(
+            {"meta": {"api-version": "1.1"},
+             "projects": [{"name": package_dir.rpartition("/")[2]} for package_dir in sorted(package_dirs)]}, indent=1))
+    write_if_changed(manifest_path, json.dumps({"wheels": dict(sorted(files.items()))}, indent=1))
+
+    if lock_requirements:
+        if pyodide_version is None:
+            raise ValueError("A Pyodide version is required to generate the lock files")
+        local_wheels: Dict[str, List[Tuple[Dict[str, Any], Path]]] = defaultdict(list)
+        for package, wheels in sources.items():
+            if "/" in package:
+                continue  # Variants are swapped in by bootstrap_in_pyodide.py
+            for fname in wheels:
+                local_wheels[package].append((files[f"{package}/{fname}"], out_path / package / fname))
+        full_lock, closure_lock = generate_pyodide_locks(lock_requirements, local_wheels, pyodide_version)
+        rewritten_pages += write_if_changed(out_path / "pyodide-lock.json", json.dumps(full_lock, indent=1))
+        rewritten_pages += write_if_changed(out_path / "micropip-lock.json", json.dumps(closure_lock, indent=1))
+
+    for key in added:
+        log.info(f"➕ Added {key}")
+    for key in replaced:
+        log.info(f"🔁 Replaced {key}")
+    log.info(f"✅ Static PyPI repo generated with {len(sources)} packages and {len(files)} wheels "
+             f"({len(added)} added, {len(replaced)} replaced, {unchanged} untouched, {rewritten_pages} pages rewritten).")
 
 
 def main() -> None:
@@ -126,9 +470,36 @@ def main() -> None:
         help="Output directory for the static repository (default: docs/)"
     )
 
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Ignore the manifest from previous runs and rehash all wheels"
+    )
+
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of processes used to hash and inspect new wheels (default: number of CPUs)"
+    )
+
+    parser.add_argument(
+        "--lock",
+        nargs="+",
+        default=None,
+        help="Also write pyodide-lock.json and micropip-lock.json pinning these requirements and their dependencies"
+    )
+
+    parser.add_argument(
+        "--pyodide-version",
+        default=None,
+        help="Pyodide version (and distribution lock) to resolve the --lock requirements for (e.g. 0.29.3)"
+    )
+
     args = parser.parse_args()
 
-    build_static_repo(args.wheels, args.output, args.base_url)
+    build_static_repo(args.wheels, args.output, args.base_url, incremental=not args.rebuild, jobs=args.jobs,
+                      lock_requirements=args.lock, pyodide_version=args.pyodide_version)
 
 
 if __name__ == "__main__":
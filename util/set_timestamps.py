@@ -1,55 +1,118 @@
+import argparse
+import hashlib
 import os
 import sys
 import subprocess
 import re
-from pathlib import Path
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
-def usage():
-    print(f"Usage: {sys.argv[0]} <directory>")
-    sys.exit(1)
+FALLBACK_TIMESTAMP = "200001010000.00"
+HASH_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc).timestamp()  # Same on every machine (whatever its timezone)
+HASH_RANGE = 1 << 28  # Seconds (~8.5 years) after HASH_EPOCH
 
-def get_last_commit_timestamp():
-    if os.path.isdir('.git'):
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sets old (stable) timestamps for all files in a directory, so that "
+                                                 "make and ccache consider freshly fetched sources up to date.")
+    parser.add_argument("directory")
+    parser.add_argument("--hash", action="store_true",
+                        help="derive each timestamp from the file contents (also with _FORCE_OLD_SOURCES=hash) "
+                             "instead of using the last Git commit time of the directory")
+    parser.add_argument("--dry-run", action="store_true", help="only report how many files would change")
+    parser.add_argument("--jobs", type=int, default=min(32, 4 * (os.cpu_count() or 1)), help="parallel workers")
+    return parser.parse_args()
+
+
+def get_last_commit_timestamp(target_dir):
+    # Only if the directory is the root of a Git repository (not just somewhere inside another one)
+    if os.path.isdir(os.path.join(target_dir, '.git')):
         try:
-            subprocess.run(["git", "rev-parse", "--is-inside-work-tree"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
             result = subprocess.run(["git", "log", "-1", "--pretty=format:%ad", "--date=format-local:%Y%m%d%H%M.%S"],
-                                    check=True, capture_output=True, text=True)
+                                    cwd=target_dir, check=True, capture_output=True, text=True)
             timestamp = result.stdout.strip()
             if re.fullmatch(r"\d{12}(\.\d{2})?", timestamp):
                 return timestamp
         except subprocess.CalledProcessError:
             pass
-    print(f"Warning: Using fallback timestamp for {os.getcwd()}")
-    return "200001010000.00"  # Fallback timestamp
+    print(f"Warning: Using fallback timestamp for {target_dir}")
+    return FALLBACK_TIMESTAMP
+
+
+def parse_timestamp(timestamp):
+    """Parses a `touch -t` timestamp ([[CC]YY]MMDDhhmm[.ss], always with the century here) as local time."""
+    return datetime.strptime(timestamp, "%Y%m%d%H%M.%S" if "." in timestamp else "%Y%m%d%H%M").timestamp()
+
+
+def hash_timestamp(path):
+    """A timestamp derived from the contents of the file, so that it is the same on every machine."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return HASH_EPOCH + int.from_bytes(digest.digest()[:8], "big") % HASH_RANGE
+
 
-def set_file_timestamps(target_dir, timestamp):
-    for path in Path(target_dir).rglob('*'):
-        if path.is_file():
+def list_files(target_dir):
+    for root, dirs, files in os.walk(target_dir):
+        dirs[:] = [d for d in dirs if d != '.git']
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.isfile(path):  # Skips broken symlinks (others are followed, like touch does)
+                yield path
+
+
+def set_file_timestamps(paths, timestamp=None, dry_run=False, jobs=1):
+    """Sets the modification and access times of all paths to timestamp (seconds), or to the hash of their contents if
+    timestamp is None. Returns the number of files whose modification time changed (or would change)."""
+    def set_chunk(chunk):
+        changed = 0
+        for path in chunk:
             try:
-                subprocess.run(["touch", "-t", timestamp, str(path)], check=True)
-            except subprocess.CalledProcessError as e:
+                new_time = hash_timestamp(path) if timestamp is None else timestamp
+                if os.stat(path).st_mtime == new_time:
+                    continue
+                changed += 1
+                if not dry_run:
+                    os.utime(path, (new_time, new_time))
+            except OSError as e:
                 print(f"Warning: Failed to set timestamp for {path}: {e}")
+        return changed
+
+    chunk_size = 256
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        return sum(executor.map(set_chunk, chunks))
 
-def main():
-    if len(sys.argv) != 2:
-        usage()
 
-    target_dir = sys.argv[1]
+def main():
+    args = parse_args()
+    target_dir = args.directory
     if not os.path.isdir(target_dir):
         print(f"Error: '{target_dir}' is not a valid directory.")
         sys.exit(1)
 
-    if os.environ.get("_FORCE_OLD_SOURCES") is None:
+    force_old_sources = os.environ.get("_FORCE_OLD_SOURCES")
+    if force_old_sources is None and not args.dry_run:
         print(f"-- Skipping setting old timestamps for files in {target_dir}")
         sys.exit(0)
+    use_hash = args.hash or (force_old_sources or "").lower() == "hash"
+
+    if use_hash:
+        print(f"-- Setting content-hash timestamps for all files in {target_dir}")
+        timestamp, description = None, "their content hashes"
     else:
         print(f"-- Setting last Git commit timestamp for all files in {target_dir}")
+        description = get_last_commit_timestamp(target_dir)
+        timestamp = parse_timestamp(description)
+
+    paths = list(list_files(target_dir))
+    changed = set_file_timestamps(paths, timestamp, args.dry_run, args.jobs)
+    if args.dry_run:
+        print(f"-- Dry run: {changed} of {len(paths)} file timestamps would be set to {description}")
+    else:
+        print(f"-- All file timestamps set to: {description} ({changed} of {len(paths)} changed)")
 
-    os.chdir(target_dir)
-    timestamp = get_last_commit_timestamp()
-    set_file_timestamps(".", timestamp)
-    print(f"-- All file timestamps set to: {timestamp}")
 
 if __name__ == "__main__":
     main()